@@ -1,32 +1,54 @@
+import time
+# start of the clock for --startup-report
+STARTED = time.perf_counter()
+
 import os
-import json
+import sys
+import argparse
+import contextlib
+import multiprocessing
 import re
 import warnings
 import tkinter as tk
-import pandas as pd
-from tkinter import filedialog
-from datetime import datetime, timedelta
-
-from reading import *
-from util import *
-
-# check if config.json exist, if not create it
-if not os.path.isfile('config.json'):
-    with open('config.json', 'w') as f:
-        json.dump({}, f)
-
-# check if config.json has non-empty "VaultPath" field, if not create it
-with open('config.json', 'r') as f:
-    config = json.load(f)
+from tkinter import filedialog, ttk
+from datetime import datetime
+
+# only light modules are imported up front; pandas/numpy (catalog, search) and the PDF libraries (export)
+# are imported where they are first needed, so the window shows up before they have loaded
+from scanner import DEFAULT_SCAN_WORKERS
+from attachments import AttachmentIndex
+from writeback import start_write_back, apply_write_back, DEFAULT_WRITE_BACK_WORKERS
+from jobs import JobRunner
+from watcher import VaultWatcher, DEFAULT_POLL_INTERVAL, DEFAULT_FULL_SCAN_INTERVAL, DEFAULT_QUIET_PERIOD
+from settings import load_config, save_config
+from instrument import enable_tracing, disable_tracing, profile
+
+# filled in by main() from the per-user settings file (or --config)
+config = {}
+config_file = None
+
+startup_report = False
+# (path, mode) from --profile-export: the next export runs under the profiler
+profile_next_export = None
+last_startup_mark = 0.0
+
+def mark_startup(label):
+    # with --startup-report, print how long startup took up to this point
+    global last_startup_mark
+    if not startup_report:
+        return
+    elapsed = time.perf_counter() - STARTED
+    heavy = [name for name in ('pandas', 'numpy', 'reportlab', 'PIL', 'pypdfium2') if name in sys.modules]
+    print(f"[startup] {elapsed:7.3f}s (+{elapsed - last_startup_mark:.3f}s) {label}; loaded: {', '.join(heavy) or 'no heavy modules'}")
+    last_startup_mark = elapsed
 
 def select_folder():
     folder_selected = filedialog.askdirectory()
     if folder_selected:
         print(f"Folder selected: {folder_selected}")
-        # Update config.json with the selected folder path
-        with open('config.json', 'w') as f:
-            config['VaultPath'] = folder_selected
-            json.dump(config, f)
+        # Update the settings with the selected folder path
+        config['VaultPath'] = folder_selected
+        save_config(config, config_file)
 
 def set_vault_path():
     root = tk.Tk()
@@ -41,8 +63,7 @@ def get_vault_path(force = False):
     if not config.get('VaultPath') or force:
         config['VaultPath'] = ''
         set_vault_path()
-        with open('config.json', 'w') as f:
-            json.dump(config, f)
+        save_config(config, config_file)
     
     return config['VaultPath']
 
@@ -71,76 +92,256 @@ def tag_format_check(vault_path):
 
 cached_searched_df = None
 vault_path = ""
-
-
-def update_last_practice_date(md_file_path):
-    # Read the current date
-    current_date = datetime.now().strftime('%Y-%m-%d')
-
-    # Read the content of the Markdown file
-    with open(md_file_path, 'r') as file:
-        content = file.read()
-
-    # Define a regular expression pattern to find the "Last Practice Date" line
-    date_pattern = re.compile(r'Last Practice Date:.*')
-
-    # Replace the existing date with the current date
-    new_content = date_pattern.sub(f'Last Practice Date: {current_date}', content)
-
-    # Write the updated content back to the file
-    with open(md_file_path, 'w') as file:
-        file.write(new_content)
-
-def export_to_pdf(date_str, selected_tags, df):
-    global cached_searched_df
-    if not date_str:
-        # default to 10 days ago
-        date_str = (datetime.now() - timedelta(days=10)).strftime('%Y-%m-%d')
-    date = datetime.strptime(date_str, '%Y-%m-%d')
+render_cache = None
+export_cache = None
+attachment_index = None
+practice_history = None
+
+def get_render_cache():
+    from export import open_render_cache
+    global render_cache
+    if render_cache is None:
+        render_cache = open_render_cache(config)
+    return render_cache
+
+def get_export_cache():
+    from export import open_export_cache
+    global export_cache
+    if export_cache is None:
+        export_cache = open_export_cache(config)
+    return export_cache
+
+
+def parse_budget(budget_str):
+    # minutes from the budget entry (pre-filled with ScheduleBudgetMinutes); None (empty) to use the cutoff date instead
+    budget_str = budget_str.strip()
+    if not budget_str:
+        return None
+    try:
+        return float(budget_str)
+    except ValueError:
+        warnings.warn(f"Ignoring invalid practice budget '{budget_str}'.")
+        return None
+
+def export_budget(date_str, budget_str):
+    # a cutoff date typed by the user wins over the budget (which may just be pre-filled from the settings), as --cutoff does in cli.py
+    if date_str.strip():
+        return None
+    return parse_budget(budget_str)
+
+def export_to_pdf(date_str, budget_str, selected_tags, catalog, runner, progress_view):
+    # runs on the Tk thread: picks the readings and output path, then renders on a worker thread
+    from export import default_cutoff, select_for_export, choose_output_path
     if cached_searched_df is None or cached_searched_df.empty:
         warnings.warn("No search results to export.")
         return
-    
-    # filter out all readings that are not practiced after the date
-    filtered_df = cached_searched_df[cached_searched_df['last_practice_date'] < date]
 
-    print(filtered_df)
+    budget = export_budget(date_str, budget_str)
+    if date_str.strip() and budget_str.strip():
+        warnings.warn(f"Exporting by the cutoff date {date_str.strip()}; the practice budget of {budget_str.strip()} minutes is ignored.")
+    date_str = date_str.strip() or default_cutoff()
+    if budget is not None:
+        # the best scoring pieces that fit in today's practice time (see scheduler.py)
+        from scheduler import schedule_readings
+        filtered_df = schedule_readings(cached_searched_df, config, budget)
+    else:
+        # filter out all readings that are not practiced after the date
+        filtered_df = select_for_export(cached_searched_df, date_str)
 
+    print(filtered_df)
+    if filtered_df.empty:
+        warnings.warn("Nothing to export: no piece matches the cutoff date or the practice budget.")
+        return
 
-    # Example usage
-    global vault_path
-    # output path is output.pdf under current directory
+    # output path is under current directory
     current_time_str = datetime.now().strftime('%Y-%m-%d')
     
-    # create a string of all selected tags (value is true) connected by "_"
+    # name the file after all selected tags (value is true)
     print('\nselected_tags', selected_tags, '\n')
-    selected_tags_str = '_'.join([tag for tag, value in selected_tags.items() if value.get()])
-    output_pdf_path_template = 'output_{selected_tags_str}_{current_time_str}{tail}.pdf'.format(selected_tags_str=selected_tags_str, current_time_str=current_time_str, tail = "{}")
-    output_pdf_path = output_pdf_path_template.format("")
-    i = 1
-    while os.path.exists(output_pdf_path):
-        output_pdf_path = output_pdf_path_template.format("_" + str(i))
-        i += 1
-
-    md_strings = []
-    for index, row in filtered_df.iterrows():
-        md_string = f"Name: {row['name']}\nTags: {row['tags']}\nLast Practice Date: {row['last_practice_date'].strftime('%Y-%m-%d')}\n\n{row['body']}"
-        md_strings.append(md_string)
-        
-    convert_markdown_to_pdf(md_strings, vault_path, output_pdf_path)
-
-    for index, row in filtered_df.iterrows():
-        path = row['path']
-        update_last_practice_date(path)
-
-        df.loc[index, 'last_practice_date'] = current_time_str
-    
-
-
+    output_pdf_path = choose_output_path([tag for tag, value in selected_tags.items() if value.get()], current_time_str)
+
+    def finish(outputs):
+        write_back(catalog, filtered_df, current_time_str, runner)
+        progress_view.finish(f"Exported {len(filtered_df)} pieces to {', '.join(outputs)}")
+
+    job = runner.start(
+        'export',
+        lambda job: render_export(job, filtered_df, output_pdf_path),
+        on_done=finish,
+        on_error=lambda e: progress_view.finish(f"Export failed: {type(e).__name__}: {e}"),
+        on_cancel=lambda: progress_view.finish("Export cancelled."),
+        on_progress=progress_view.update
+    )
+    progress_view.start(job)
+
+def render_export(job, filtered_df, output_pdf_path):
+    # runs on a worker thread; job.progress raises JobCancelled when the user cancels, before anything is written
+    from export import export_readings
+    global profile_next_export
+    if profile_next_export is not None:
+        profiler, profile_next_export = profile(*profile_next_export), None
+    else:
+        profiler = contextlib.nullcontext()
+    with profiler:
+        outputs = export_readings(filtered_df, output_pdf_path, vault_path, config, get_render_cache(), attachment_index, progress=job.progress, export_cache=get_export_cache())
+    print(f"Render cache: {render_cache.hits} hits, {render_cache.misses} misses")
+    return outputs
+
+def write_back(catalog, filtered_df, current_time_str, runner):
+    # write the new date back into the notes on a background thread; the catalog is updated right away.
+    # The updates go to the frame that is current when they are applied (a reload may have replaced it)
+    from export import write_back_entries, mark_practiced, record_practice
+    record_practice(practice_history, filtered_df, current_time_str)
+    future = start_write_back(write_back_entries(filtered_df), current_time_str, workers=config.get('WriteBackWorkers', DEFAULT_WRITE_BACK_WORKERS))
+    future.add_done_callback(lambda done: runner.call_soon(lambda: apply_write_back(catalog.df, done.result())))
+    mark_practiced(catalog.df, filtered_df['path'].astype(str), current_time_str)
+
+def start_vault_watcher(catalog, runner, on_update):
+    # edits made in the note app while the tracker is open are applied in batches on the watcher thread
+    def apply_changes(paths, rescan):
+        update, errors = catalog.apply_changes(paths, rescan)
+        for file_path, error in errors:
+            warnings.warn(f"Could not parse '{file_path}': {error}")
+        directories = None if rescan else {path if os.path.isdir(path) else os.path.dirname(path) for path in paths}
+        attachment_index.refresh(directories).save()
+        if update is not None:
+            runner.call_soon(on_update, update)
+
+    return VaultWatcher(
+        catalog.vault_path, apply_changes,
+        backend=config.get('WatchBackend', 'auto'),
+        poll_interval=config.get('WatchPollInterval', DEFAULT_POLL_INTERVAL),
+        full_scan_interval=config.get('WatchFullScanInterval', DEFAULT_FULL_SCAN_INTERVAL),
+        quiet_period=config.get('WatchQuietPeriod', DEFAULT_QUIET_PERIOD)
+    ).start()
+
+class ProgressView:
+    # progress bar, per-piece status and cancel button for the running export
+    def __init__(self, parent):
+        self.frame = tk.Frame(parent)
+        self.bar = ttk.Progressbar(self.frame, length=400, mode='determinate')
+        self.bar.pack(side=tk.LEFT, padx=5, pady=5)
+        self.status = tk.Label(self.frame, text="", width=60, anchor='w')
+        self.status.pack(side=tk.LEFT, padx=5, pady=5)
+        self.cancel_button = tk.Button(self.frame, text="Cancel", state=tk.DISABLED, command=self.cancel)
+        self.cancel_button.pack(side=tk.LEFT, padx=5, pady=5)
+        self.job = None
+
+    @property
+    def busy(self):
+        return self.job is not None
+
+    def start(self, job):
+        self.job = job
+        self.bar['value'] = 0
+        self.status.config(text="Starting export...")
+        self.cancel_button.config(state=tk.NORMAL)
+
+    def update(self, done, total, status):
+        self.bar['maximum'] = max(total, 1)
+        self.bar['value'] = done
+        self.status.config(text=f"{done}/{total}: {status}")
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.status.config(text="Cancelling...")
+
+    def finish(self, message):
+        self.job = None
+        self.status.config(text=message)
+        self.cancel_button.config(state=tk.DISABLED)
+
+class VirtualList:
+    """Listbox that only holds the rows currently in view; `source` just needs len() and slicing."""
+
+    def __init__(self, parent, height=40, width=80):
+        self.frame = tk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, height=height, width=width)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.scrollbar = tk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.on_scroll)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.bind('<MouseWheel>', lambda event: self.scroll_by(-1 if event.delta > 0 else 1, 'units'))
+        self.listbox.bind('<Button-4>', lambda event: self.scroll_by(-1, 'units'))
+        self.listbox.bind('<Button-5>', lambda event: self.scroll_by(1, 'units'))
+        self.source = []
+        self.first = 0
+
+    @property
+    def visible_count(self):
+        return int(self.listbox.cget('height'))
+
+    def set_source(self, source):
+        self.source = source
+        self.first = 0
+        self.render()
+
+    def show_message(self, text):
+        self.set_source([text])
+
+    def on_scroll(self, action, amount, unit=None):
+        if action == tk.MOVETO:
+            self.first = int(float(amount) * len(self.source))
+            self.render()
+        else:
+            self.scroll_by(int(amount), unit)
+        return 'break'
+
+    def scroll_by(self, amount, unit):
+        step = self.visible_count if unit == 'pages' else 3
+        self.first += amount * step
+        self.render()
+        return 'break'
+
+    def render(self):
+        total = len(self.source)
+        self.first = max(0, min(self.first, total - self.visible_count))
+        rows = self.source[self.first:self.first + self.visible_count]
+        self.listbox.delete(0, tk.END)
+        if rows:
+            self.listbox.insert(tk.END, *rows)
+        if total:
+            self.scrollbar.set(self.first / total, min(1.0, (self.first + len(rows)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+def load_vault(vault_path, rebuild=False):
+    # runs on a worker thread while the window is already up; this is where pandas and numpy get imported
+    from catalog import load_catalog, catalog_memory_report, LiveCatalog
+
+    # extract all tags from the tags folder and all readings, re-parsing only files changed since the last run
+    tags, readings, errors = load_catalog(
+        vault_path,
+        rebuild=rebuild,
+        workers=config.get('ScanWorkers', DEFAULT_SCAN_WORKERS),
+        use_processes=config.get('ScanExecutor') == 'process'
+    )
+    for file_path, error in errors:
+        warnings.warn(f"Could not parse '{file_path}': {error}")
+
+    global attachment_index
+    attachment_index = AttachmentIndex.load(vault_path).refresh()
+    attachment_index.save()
+    for name, paths in attachment_index.duplicates().items():
+        warnings.warn(f"Attachment name '{name}' is used by {len(paths)} files: {paths}")
+
+    catalog = LiveCatalog(
+        vault_path, tags, readings,
+        workers=config.get('ScanWorkers', DEFAULT_SCAN_WORKERS),
+        use_processes=config.get('ScanExecutor') == 'process'
+    )
+    # practice dates logged by earlier exports win over older dates in the notes
+    from history import open_history
+    global practice_history
+    practice_history = catalog.history = open_history(vault_path, catalog.df)
+    memory = catalog_memory_report(catalog.df)
+    print(f"\nCatalog memory: {memory.sum() / 1024:.1f} KiB\n{memory.to_string()}\n")
+    return catalog
 
 # GUI Creation
-def create_gui(tags, df):
-    tag_to_type = {tag: tag_type for tag_type, tag_list in tags.items() for tag in tag_list}
+def create_gui(vault_path, rebuild=False):
+    # the window is built right away; the tag checkboxes are added once the catalog has loaded
+    catalog = None
 
     root = tk.Tk()
     root.title("Tag Selector")
@@ -157,11 +358,13 @@ def create_gui(tags, df):
     result_label = tk.Label(result_frame, text="Search Results", font=("Helvetica", 16),padx=40, pady=40)
     result_label.pack()
     
-    result_listbox = tk.Listbox(result_frame, height=80, width=80)
-    result_listbox.pack()
+    result_listbox = VirtualList(result_frame, height=40, width=80)
+    result_listbox.frame.pack()
+    result_listbox.show_message("Loading catalog...")
 
 
-    selected_tags = {tag: tk.BooleanVar() for tag_type in tags.values() for tag in tag_type}
+    selected_tags = {}
+    checkbuttons = {}
 
     # date selection frame
     date_frame = tk.Frame(root)
@@ -172,158 +375,229 @@ def create_gui(tags, df):
 
     date_entry = tk.Entry(date_frame)
     date_entry.pack(side=tk.LEFT, padx=5, pady=5)
+    date_entry.bind('<KeyRelease>', lambda event: schedule_refresh())
+
+    # with a budget, the export is chosen by the scheduler instead of the date
+    budget_label = tk.Label(date_frame, text="or Practice Budget (minutes):")
+    budget_label.pack(side=tk.LEFT, padx=5, pady=5)
+
+    budget_entry = tk.Entry(date_frame, width=8)
+    budget_entry.pack(side=tk.LEFT, padx=5, pady=5)
+    if config.get('ScheduleBudgetMinutes') is not None:
+        budget_entry.insert(0, str(config['ScheduleBudgetMinutes']))
+    budget_entry.bind('<KeyRelease>', lambda event: schedule_refresh())
 
     # Tag selection frame
     tag_frame = tk.Frame(root)
     tag_frame.grid(row=0, column=0, padx=10, pady=10)
 
-    for tag_type, tag_list in tags.items():
-        frame = tk.Frame(tag_frame)
-        frame.pack(side=tk.LEFT, padx=10, pady=10)
-
-        label = tk.Label(frame, text=tag_type)
-        label.pack()
-
-        tag_list.sort()
-        for tag in tag_list:
-            checkbutton = tk.Checkbutton(frame, text=tag, variable=selected_tags[tag])
-            checkbutton.pack()
-
-    
+    match_label = tk.Label(result_frame, text="")
+    match_label.pack()
+
+    schedule_label = tk.Label(result_frame, text="")
+    schedule_label.pack()
+
+    # searches and exports run on worker threads; their results come back through the runner's queue
+    runner = JobRunner()
+    pending_refresh = None
+
+    def refresh():
+        # facet counts come from popcounts over the cached tag masks, cheap enough to run on the Tk thread
+        nonlocal pending_refresh
+        pending_refresh = None
+        if catalog is None:
+            return
+        tag_index = catalog.tag_index
+        selected = {tag for tag, var in selected_tags.items() if var.get() and tag in tag_index.tag_to_type}
+        for tag, count in tag_index.facet_counts(selected).items():
+            if tag in checkbuttons:
+                checkbuttons[tag].config(text=f"{tag} ({count})")
+        match_label.config(text=f"{tag_index.count(selected) if selected else 0} pieces match")
+        search_and_display(catalog.df, selected_tags, result_listbox, tag_index.tag_to_type, runner, tag_index, export_budget(date_entry.get(), budget_entry.get()), schedule_label)
+
+    def schedule_refresh():
+        # debounce: a burst of clicks triggers a single refresh once the clicking stops
+        nonlocal pending_refresh
+        if pending_refresh is not None:
+            root.after_cancel(pending_refresh)
+        pending_refresh = root.after(config.get('FilterDebounceMs', 150), refresh)
+    progress_view = ProgressView(root)
+    progress_view.frame.grid(row=2, column=1, padx=20, pady=10)
+
+    def build_checkboxes(tags):
+        # one column of checkboxes per tag type; tags that are still there keep their state when rebuilt
+        previous = {tag: var.get() for tag, var in selected_tags.items()}
+        for child in tag_frame.winfo_children():
+            child.destroy()
+        selected_tags.clear()
+        checkbuttons.clear()
+        for tag_type, tag_list in tags.items():
+            frame = tk.Frame(tag_frame)
+            frame.pack(side=tk.LEFT, padx=10, pady=10)
+
+            label = tk.Label(frame, text=tag_type)
+            label.pack()
+
+            tag_list.sort()
+            for tag in tag_list:
+                selected_tags[tag] = tk.BooleanVar(value=previous.get(tag, False))
+                checkbutton = tk.Checkbutton(frame, text=tag, variable=selected_tags[tag], command=lambda: schedule_refresh())
+                checkbutton.pack(anchor='w')
+                checkbuttons[tag] = checkbutton
+
+    def show_catalog(loaded):
+        nonlocal catalog
+        catalog = loaded
+        build_checkboxes(catalog.tags)
+        mark_startup("catalog loaded")
+        refresh()
+        if config.get('WatchVault', True):
+            start_vault_watcher(catalog, runner, catalog_updated)
+
+    def start_export():
+        if catalog is None:
+            return
+        if progress_view.busy:
+            warnings.warn("An export is already running.")
+            return
+        export_to_pdf(date_entry.get(), budget_entry.get(), selected_tags, catalog, runner, progress_view)
+
+    def catalog_updated(update):
+        # the checkboxes sort their tag lists, so the lists are compared as sets
+        tags_changed = {tag_type: set(tag_list) for tag_type, tag_list in update[0].items()} != {tag_type: set(tag_list) for tag_type, tag_list in catalog.tags.items()}
+        catalog.commit(update)
+        if tags_changed:
+            build_checkboxes(catalog.tags)
+        refresh()
 
     # Search button
-    search_button = tk.Button(root, text="Search", command=lambda: search_and_display(df, selected_tags, result_listbox, tag_to_type))
+    search_button = tk.Button(root, text="Search", command=refresh)
     search_button.grid(row=0, column=2, padx=10, pady=10)
 
     # export button
-    export_button = tk.Button(root, text="Export", command=lambda: export_to_pdf(date_entry.get(), selected_tags, df))
+    export_button = tk.Button(root, text="Export", command=start_export)
     export_button.grid(row=1, column=2, padx=10, pady=10)
 
+    runner.start(
+        'load', lambda job: load_vault(vault_path, rebuild),
+        on_done=show_catalog,
+        on_error=lambda e: result_listbox.show_message(f"Could not load the vault: {type(e).__name__}: {e}")
+    )
+    root.after_idle(mark_startup, "window shown")
+    runner.poll(root)
     root.mainloop()
 
-def filter_dataframe(df, selected, tag_to_type):
-    grouped_selected = {}
-    for selected_tag in selected:
-        tag_type = tag_to_type[selected_tag]
-        if not grouped_selected.get(tag_type):
-            grouped_selected[tag_type] = []
-        grouped_selected[tag_type] = grouped_selected[tag_type] + [selected_tag]
-    combined_mask = pd.Series([True] * len(df))
-
-    masks = []
-    for tag_type, tag_list in grouped_selected.items():
-        if tag_list:
-            # Create a mask for each non-empty tag list
-            type_mask = df[tag_list[0]]
-            for tag in tag_list[1:]:
-                type_mask |= df[tag]
-            masks.append(type_mask)
-
-    if masks:
-        # Combine masks using logical "AND"
-        combined_mask = masks[0]
-        for mask in masks[1:]:
-            combined_mask &= mask
-        return df[combined_mask]
-    else:
-        return df
+search_generation = 0
 
-def search_and_display(df, selected_tags, result_listbox, tag_to_type):
-    selected = {tag for tag, var in selected_tags.items() if var.get()}
+def search_and_display(df, selected_tags, result_listbox, tag_to_type, runner, tag_index=None, budget=None, schedule_label=None):
+    # only tags the catalog knows; a checkbox can outlive its tag until the next catalog update is shown
+    selected = {tag for tag, var in selected_tags.items() if var.get() and tag in tag_to_type}
 
     if not selected:
-        result_listbox.delete(0, tk.END)
-        result_listbox.insert(tk.END, "No tags selected.")
+        result_listbox.show_message("No tags selected.")
+        if schedule_label is not None:
+            schedule_label.config(text="")
         return
 
-    filtered_df = filter_dataframe(df, selected, tag_to_type)
-
-    # Sort by last_practice_date in descending order
-    sorted_df = filtered_df.sort_values(by= ['last_practice_date','name'], ascending=True)
-    global cached_searched_df
-    cached_searched_df = sorted_df
-
-    # Display results
-    result_listbox.delete(0, tk.END)
-    for index, row in sorted_df.iterrows():
-        true_tags = [tag for tag in selected if row[tag]]
-        formatted_result = f"Date: {row['last_practice_date'].strftime('%Y-%m-%d')}, Tags: {true_tags}, Name: {row['name']}"
-        result_listbox.insert(tk.END, formatted_result)
+    # only the newest search gets displayed, so searches can be started while another one is still running
+    global search_generation
+    search_generation += 1
+    generation = search_generation
+    # the Tk thread keeps updating the catalog frame in place (write-back, practice dates), so the worker gets its own copy
+    df = df.copy()
+
+    def search(job):
+        from export import search_readings
+        sorted_df = search_readings(df, selected, tag_to_type, tag_index)
+        summary = ""
+        if budget is not None:
+            # re-scored on every search so the label follows the checkboxes
+            from scheduler import schedule_readings, reading_minutes
+            scheduled_df = schedule_readings(sorted_df, config, budget)
+            summary = f"{len(scheduled_df)} pieces scheduled ({reading_minutes(scheduled_df, config).sum():.0f} of {budget:g} minutes)"
+        return sorted_df, summary
+
+    def display(result):
+        if generation != search_generation:
+            return
+        sorted_df, summary = result
+        global cached_searched_df
+        cached_searched_df = sorted_df
+        if schedule_label is not None:
+            schedule_label.config(text=summary)
+
+        # Display results; rows are formatted a page at a time as they scroll into view
+        from results import ResultPages
+        result_listbox.set_source(ResultPages(sorted_df, selected))
+
+    runner.start('search', search, on_done=display)
 
 
 selected_tags = []
 
 def main():
+    parser = argparse.ArgumentParser(description="Music Practice Selector & Tracker")
+    parser.add_argument(
+        "--rebuild-catalog",
+        action="store_true",
+        help="Ignore the catalog cache and re-parse every reading"
+    )
+    parser.add_argument(
+        "--config",
+        help="Settings file to use instead of the per-user config.json"
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="Print how long each startup step took and which heavy modules were loaded by then"
+    )
+    parser.add_argument(
+        "--trace",
+        help="Append timing spans and counters to this JSON-lines file"
+    )
+    parser.add_argument(
+        "--profile-export",
+        help="Profile the first export into this file"
+    )
+    parser.add_argument(
+        "--profile-mode",
+        choices=['cprofile', 'sampling'],
+        default='cprofile',
+        help="cprofile: pstats file; sampling: collapsed stacks for flame graphs"
+    )
+    args = parser.parse_args()
+
+    global config_file, startup_report, profile_next_export
+    config_file = args.config
+    startup_report = args.startup_report
+    mark_startup("imports done")
+    config.update(load_config(config_file))
+    mark_startup("settings loaded")
+    trace_path = args.trace or config.get('TracePath')
+    if trace_path:
+        enable_tracing(trace_path)
+    if args.profile_export:
+        profile_next_export = (args.profile_export, args.profile_mode)
+
     global vault_path
     vault_path = get_vault_path()
     # check if user want to change vault path; if user input Y or yes, then change vault path
     while input(f"Vault path is set to '{vault_path}'.\nDo you want to change it? Reply yes/y to change, otherwise this path will be used: ").lower() in ['y', 'yes']:
         vault_path = get_vault_path(force=True)
+    mark_startup("vault path confirmed")
 
     try:
         tag_format_check(vault_path)
     except UserWarning as e:
         print(e)
 
-    # extract all tags from the tags folder
-    tags = {}
-    tag_folder_path = os.path.join(vault_path, 'Tags')
-    tag_files = [f for f in os.listdir(tag_folder_path) if os.path.isfile(os.path.join(tag_folder_path, f))]
-    for file in tag_files:
-        file_path = os.path.join(tag_folder_path, file)        
-        file_name = file.split('.')[0]
-        tags[file_name] = extract_tags(file_path)
-    
-    # print(f"Tag files: {tag_files}")
-    # for tag_type, tag in tags.items():
-    #     print(tag_type, tag)
-        
-
-    # recursively process all file in folder "Readings" of the vault (and maybe subfolder of reading); ones that ends with .md
-    readings_folder_path = os.path.join(vault_path, 'Readings')
-    md_file_paths = []
-    for dirpath, dirnames, filenames in os.walk(readings_folder_path):
-        for filename in filenames:
-            if filename.endswith('.md'):
-                file_path = os.path.join(dirpath, filename)
-                md_file_paths.append(file_path)
-    
-    readings = []
-    for file_path in md_file_paths:
-        # print(file_path)
-        reading = process_md_file(file_path)
-        readings.append(reading)
-    # print(readings)
-
-    # convert readings to pandas dataframe with one-hot columns for all potential tags
-    tmp = list(tags.values())
-    tags_lst = [item for sublist in tmp for item in sublist]
-    
-    df = pd.DataFrame(columns=["name", "last_practice_date","tags"] + tags_lst + ["body"])
-    print("\n\n", df, "\n\n")
-    for idx, reading in enumerate(readings):
-        row_data = {
-            "name": reading.name,
-            "last_practice_date": reading.last_practice_date,
-            "tags": reading.tags,
-            "body": reading.body,
-            "path": reading.file_path
-        }
-        if row_data['last_practice_date'] is None:
-            row_data['last_practice_date'] = datetime.strptime('2000-01-01', '%Y-%m-%d')
-        for tag in tags_lst:
-            row_data[tag] = tag in reading.tags
-        df = df._append(pd.Series(row_data, name=idx))
-    df["last_practice_date"].fillna(pd.Timestamp('2000-01-01'), inplace=True)
-
-    # fill last_practice_date where it is NaT with 2000-01-01
-
-    # turn the readings list into a pandas dataframe, with one-hot columns for all potential tags
-    # each row is a reading
-    # readings_df = pd.
-    
-    create_gui(tags,df)
+    try:
+        create_gui(vault_path, rebuild=args.rebuild_catalog)
+    finally:
+        disable_tracing()
 
 if __name__ == '__main__':
+    # needed for the render worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
 
     main()
\ No newline at end of file
@@ -0,0 +1,157 @@
+import os
+import json
+import threading
+import warnings
+
+from storage import vault_cache_dir, atomic_write_text
+from instrument import traced, count
+
+# bump whenever the layout of attachments.json changes; older indexes are discarded on load
+ATTACHMENT_INDEX_VERSION = 1
+ATTACHMENT_INDEX_FILE_NAME = 'attachments.json'
+
+class AttachmentIndex:
+    """Vault-wide basename -> path(s) index used to resolve ![[...]] links.
+
+    The listing of every folder is persisted next to the catalog cache together with the folder's mtime;
+    refresh() only re-lists folders whose mtime changed (a file was added, removed or renamed in them).
+    Folders starting with '.' (.obsidian, .git, .trash, ...) are not indexed.
+    """
+
+    def __init__(self, vault_path):
+        self.vault_path = os.path.abspath(vault_path)
+        # relative folder path -> [folder mtime_ns, {file name: mtime_ns}, [sub folder names]]
+        self.directories = {}
+        self.by_name = {}
+        self.changed = False
+        # refresh() is called from the export thread and the vault watcher
+        self.lock = threading.RLock()
+
+    @property
+    def index_path(self):
+        return os.path.join(vault_cache_dir(self.vault_path), ATTACHMENT_INDEX_FILE_NAME)
+
+    @classmethod
+    def load(cls, vault_path):
+        index = cls(vault_path)
+        path = index.index_path
+        if os.path.isfile(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == ATTACHMENT_INDEX_VERSION and data.get('vault') == index.vault_path:
+                    index.directories = data['directories']
+                else:
+                    warnings.warn(f"Discarding incompatible attachment index '{path}'.")
+            except (OSError, ValueError, KeyError) as e:
+                warnings.warn(f"Discarding unreadable attachment index '{path}': {e}")
+        index.rebuild_names()
+        return index
+
+    def save(self):
+        with self.lock:
+            if not self.changed:
+                return
+            data = {'version': ATTACHMENT_INDEX_VERSION, 'vault': self.vault_path, 'directories': self.directories}
+            atomic_write_text(self.index_path, json.dumps(data))
+            self.changed = False
+
+    @traced('attachment_refresh')
+    def refresh(self, directories=None):
+        """Stat every folder (or only the given folders and the ones below them), re-listing the ones that changed."""
+        if directories is None:
+            roots = ['']
+        else:
+            roots = sorted({self.relative(directory) for directory in directories})
+            # a folder inside another refreshed folder is covered by it
+            roots = [root for root in roots if not any(root != other and self.inside(root, other) for other in roots)]
+
+        with self.lock:
+            fresh = {}
+            pending = list(roots)
+            while pending:
+                relative_dir = pending.pop()
+                directory = os.path.join(self.vault_path, relative_dir)
+                try:
+                    mtime = os.stat(directory).st_mtime_ns
+                    entry = self.directories.get(relative_dir)
+                    if not entry or entry[0] != mtime:
+                        entry = self.list_directory(directory, mtime)
+                        self.changed = True
+                        count('folders_listed')
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+                fresh[relative_dir] = entry
+                pending.extend(os.path.join(relative_dir, sub_dir) for sub_dir in entry[2])
+
+            untouched = {relative_dir: entry for relative_dir, entry in self.directories.items()
+                         if not any(self.inside(relative_dir, root) for root in roots)}
+            if len(untouched) + len(fresh) != len(self.directories) or any(relative_dir not in self.directories for relative_dir in fresh):
+                self.changed = True
+            untouched.update(fresh)
+            self.directories = untouched
+            self.rebuild_names()
+        return self
+
+    def relative(self, directory):
+        relative_dir = os.path.relpath(os.path.abspath(directory), self.vault_path)
+        return '' if relative_dir == os.curdir else relative_dir
+
+    @staticmethod
+    def inside(relative_dir, root):
+        return root == '' or relative_dir == root or relative_dir.startswith(root + os.sep)
+
+    @staticmethod
+    def list_directory(directory, mtime):
+        files = {}
+        sub_dirs = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    sub_dirs.append(entry.name)
+                elif entry.is_file():
+                    files[entry.name] = entry.stat().st_mtime_ns
+        return [mtime, files, sorted(sub_dirs)]
+
+    def rebuild_names(self):
+        by_name = {}
+        for relative_dir, (_, files, _) in self.directories.items():
+            for file_name in files:
+                by_name.setdefault(file_name, []).append(os.path.join(self.vault_path, relative_dir, file_name))
+        # shortest path first (the way Obsidian picks between files with the same name), then alphabetical
+        for paths in by_name.values():
+            paths.sort(key=lambda path: (len(path), path))
+        self.by_name = by_name
+
+    def candidates(self, link):
+        # all files a link can point to; links may carry part of the path ("Scores/etude.pdf")
+        file_name = os.path.basename(link)
+        paths = self.by_name.get(file_name, [])
+        if file_name != link:
+            suffix = os.sep + os.path.normpath(link)
+            paths = [path for path in paths if path.endswith(suffix)]
+        return paths
+
+    def resolve(self, link):
+        paths = self.candidates(link)
+        return paths[0] if paths else None
+
+    def duplicates(self):
+        # basename -> paths, for every name that appears more than once in the vault
+        return {name: paths for name, paths in self.by_name.items() if len(paths) > 1}
+
+    @traced('attachment_lookup')
+    def lookup(self, links):
+        """Resolve links the way find_files_in_directory does, warning about ambiguous and missing ones."""
+        found_files = {}
+        for link in dict.fromkeys(links):
+            paths = self.candidates(link)
+            if not paths:
+                print(f"Could not find file: {link}")
+                continue
+            if len(paths) > 1:
+                warnings.warn(f"'{link}' matches {len(paths)} files, using '{paths[0]}': {paths[1:]}")
+            found_files[link] = paths[0]
+        return found_files
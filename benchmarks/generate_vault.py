@@ -0,0 +1,129 @@
+import os
+import sys
+import random
+import argparse
+from datetime import date, timedelta
+
+# Synthetic vault for the benchmarks: Tags/, Readings/ (nested folders) and Attachments/ with PNG and PDF files,
+# laid out like a real vault so every stage of the app can run against it.
+#
+#   python benchmarks/generate_vault.py /tmp/bench_vault --readings 5000 --tag-files 4 --tags-per-file 25 --attachments 200
+
+def tag_name(tag_file, tag):
+    return f"type{tag_file}_tag{tag}"
+
+def write_tags(vault_path, tag_files, tags_per_file):
+    tag_folder = os.path.join(vault_path, 'Tags')
+    os.makedirs(tag_folder, exist_ok=True)
+    for tag_file in range(tag_files):
+        with open(os.path.join(tag_folder, f"type{tag_file}.md"), 'w') as f:
+            f.write("---\ntags:\n")
+            for tag in range(tags_per_file):
+                f.write(f"  - {tag_name(tag_file, tag)}\n")
+            f.write("---\n")
+
+def write_png(path, rng, size=(1200, 800)):
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', size, 'white')
+    draw = ImageDraw.Draw(image)
+    # staff-like lines and note heads so the file does not compress to nothing
+    for staff in range(6):
+        top = 60 + staff * 120
+        for line in range(5):
+            draw.line((40, top + line * 12, size[0] - 40, top + line * 12), fill='black', width=2)
+        for _ in range(24):
+            x = rng.randint(60, size[0] - 60)
+            y = top + rng.randint(-12, 60)
+            draw.ellipse((x, y, x + 14, y + 10), fill='black')
+    image.save(path)
+
+def write_pdf(path, rng, pages):
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+
+    c = canvas.Canvas(path, pagesize=letter)
+    width, height = letter
+    for page in range(pages):
+        for staff in range(8):
+            top = height - 80 - staff * 85
+            for line in range(5):
+                c.line(40, top - line * 8, width - 40, top - line * 8)
+            for _ in range(20):
+                c.circle(rng.uniform(60, width - 60), top - rng.uniform(-8, 40), 4, fill=1)
+        c.drawString(40, 30, f"{os.path.basename(path)} page {page + 1}")
+        c.showPage()
+    c.save()
+
+def write_attachments(vault_path, attachments, rng, folders=5, max_pages=3):
+    # half PNG, half PDF, spread over a few sub folders; returns the file names (what ![[...]] links use)
+    names = []
+    for i in range(attachments):
+        folder = os.path.join(vault_path, 'Attachments', f"set{i % folders}")
+        os.makedirs(folder, exist_ok=True)
+        if i % 2:
+            name = f"scan{i}.png"
+            write_png(os.path.join(folder, name), rng)
+        else:
+            name = f"score{i}.pdf"
+            write_pdf(os.path.join(folder, name), rng, rng.randint(1, max_pages))
+        names.append(name)
+    return names
+
+def reading_folder(vault_path, index, depth, fan_out):
+    # Readings/group<a>/sub<b>/... so the scanner has to walk nested folders
+    parts = ['Readings']
+    value = index
+    for level in range(depth):
+        parts.append(f"{'group' if level == 0 else 'sub'}{value % fan_out}")
+        value //= fan_out
+    return os.path.join(vault_path, *parts)
+
+def write_readings(vault_path, readings, tag_files, tags_per_file, attachment_names, rng, depth=2, fan_out=5, links_per_reading=2, dated_fraction=0.8):
+    start = date(2023, 1, 1)
+    for index in range(readings):
+        folder = reading_folder(vault_path, index, depth, fan_out)
+        os.makedirs(folder, exist_ok=True)
+        tags = {tag_name(rng.randrange(tag_files), rng.randrange(tags_per_file)) for _ in range(rng.randint(1, 3))} if tag_files and tags_per_file else set()
+        lines = ["---", "tags:"] + [f"  - {tag}" for tag in sorted(tags)] + ["---", "", f"# Piece {index}", ""]
+        if rng.random() < dated_fraction:
+            lines.append(f"Last Practice Date: {(start + timedelta(days=rng.randrange(700))).strftime('%Y-%m-%d')}")
+            lines.append("")
+        lines.extend(f"Practice note {line} for piece {index}: tempo {rng.randint(40, 160)} bpm." for line in range(rng.randint(1, 5)))
+        for _ in range(min(links_per_reading, len(attachment_names))):
+            if rng.random() < 0.7:
+                lines.append(f"![[{rng.choice(attachment_names)}]]")
+        with open(os.path.join(folder, f"piece{index}.md"), 'w') as f:
+            f.write("\n".join(lines) + "\n")
+
+def generate_vault(vault_path, readings=1000, tag_files=3, tags_per_file=10, attachments=20, depth=2, fan_out=5, links_per_reading=2, seed=0):
+    """Write a synthetic vault to vault_path (which must not exist yet); the same arguments give the same vault."""
+    if os.path.exists(vault_path):
+        raise FileExistsError(f"'{vault_path}' already exists.")
+    rng = random.Random(seed)
+    write_tags(vault_path, tag_files, tags_per_file)
+    attachment_names = write_attachments(vault_path, attachments, rng)
+    write_readings(vault_path, readings, tag_files, tags_per_file, attachment_names, rng, depth, fan_out, links_per_reading)
+    return vault_path
+
+def add_arguments(parser):
+    parser.add_argument("--readings", type=int, default=1000, help="Number of readings (N)")
+    parser.add_argument("--tag-files", type=int, default=3, help="Number of tag files / tag types (M)")
+    parser.add_argument("--tags-per-file", type=int, default=10, help="Tags in every tag file")
+    parser.add_argument("--attachments", type=int, default=20, help="Number of PNG/PDF attachments (K)")
+    parser.add_argument("--depth", type=int, default=2, help="Folder nesting below Readings/")
+    parser.add_argument("--fan-out", type=int, default=5, help="Sub folders per folder")
+    parser.add_argument("--links", type=int, default=2, help="Attachment links per reading (at most)")
+    parser.add_argument("--seed", type=int, default=0)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic vault for the benchmarks")
+    parser.add_argument("vault_path")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    generate_vault(args.vault_path, args.readings, args.tag_files, args.tags_per_file, args.attachments, args.depth, args.fan_out, args.links, args.seed)
+    print(f"Vault written to {args.vault_path}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import os
+import sys
+import gc
+import argparse
+import tracemalloc
+from datetime import datetime
+
+# the app is a set of top-level modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_vault import add_arguments
+
+# Memory taken by the catalog records and frame, compared with the layout used before readings were compacted
+# (a plain object per reading with its own list of tag strings and a datetime, and an object "tags" column).
+#
+#   python benchmarks/memory_benchmark.py --readings 20000
+
+class LegacyReading:
+    def __init__(self, name, tags, last_practice_date, file_path, body_offset=0):
+        self.name = name
+        self.tags = tags
+        self.last_practice_date = last_practice_date
+        self.file_path = file_path
+        self.body_offset = body_offset
+        self.signature = None
+
+def parse_legacy(file_path):
+    from frontmatter import parse_header
+    tags, date_str, body_offset = parse_header(file_path)
+    last_practice_date = datetime.strptime(date_str, '%Y-%m-%d') if date_str else None
+    return LegacyReading(os.path.basename(file_path)[:-3], tags, last_practice_date, file_path, body_offset)
+
+def measure(build):
+    # bytes still allocated by what build() returns
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, used
+
+def main(argv=None):
+    from run_benchmarks import vault_for
+    from catalog import load_tags, build_dataframe
+    from scanner import scan_md_files
+    from reading import process_md_file
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(description="Measure the memory of the catalog records and frame")
+    add_arguments(parser)
+    parser.add_argument("--vault", help="Use this vault instead of generating one")
+    args = parser.parse_args(argv)
+
+    vault_path = vault_for(args)
+    tags, _ = load_tags(vault_path, {})
+    md_files = scan_md_files(os.path.join(vault_path, 'Readings'))
+    # paths are kept by both layouts; share them so only the records themselves are measured
+    paths = [file_path for file_path, _ in md_files]
+
+    def parse(parse_file):
+        readings = [parse_file(file_path) for file_path in paths]
+        for reading, (_, signature) in zip(readings, md_files):
+            reading.signature = signature
+        return readings
+
+    legacy, legacy_bytes = measure(lambda: parse(parse_legacy))
+    readings, reading_bytes = measure(lambda: parse(process_md_file))
+    df = build_dataframe(tags, readings)
+    legacy_tags = pd.Series([reading.tags for reading in legacy], dtype=object).memory_usage(index=False, deep=True)
+    tags_column = df['tags'].memory_usage(index=False, deep=True)
+    frame = df.memory_usage(index=False, deep=True).sum()
+
+    rows = [
+        ('reading records', legacy_bytes, reading_bytes),
+        ('"tags" column', legacy_tags, tags_column),
+        ('whole frame', frame - tags_column + legacy_tags, frame),
+    ]
+    print(f"{len(readings)} readings, {sum(len(tag_list) for tag_list in tags.values())} tags")
+    print(f"{'':<18}{'before':>14}{'now':>14}{'saved':>8}")
+    for label, before, now in rows:
+        print(f"{label:<18}{before / 1024:>11.0f} KB{now / 1024:>11.0f} KB{1 - now / before:>8.0%}")
+    print(f"per reading: {legacy_bytes / len(readings):.0f} -> {reading_bytes / len(readings):.0f} bytes")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,272 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import platform
+import tempfile
+import statistics
+import contextlib
+from datetime import datetime
+
+# the app is a set of top-level modules in the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from generate_vault import generate_vault, add_arguments
+
+# Times every stage of the app against a synthetic vault and compares the result with a stored baseline.
+#
+#   python benchmarks/run_benchmarks.py --readings 5000 --save-baseline     # record benchmarks/baseline.json
+#   python benchmarks/run_benchmarks.py --readings 5000                     # compare; exit status 1 on a regression
+#
+# Generated vaults are kept in benchmarks/.vaults/ (one per set of generator arguments) and never modified:
+# the write-back stage works on copies of the notes.
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+DEFAULT_TOLERANCE = 0.25
+# slowdowns smaller than this are timer noise, whatever the ratio
+DEFAULT_MIN_DELTA_MS = 1.0
+
+def vault_for(args):
+    if args.vault:
+        return args.vault
+    params = {name: getattr(args, name) for name in ('readings', 'tag_files', 'tags_per_file', 'attachments', 'depth', 'fan_out', 'links', 'seed')}
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    vault_path = os.path.join(BENCHMARK_DIR, '.vaults', digest)
+    if not os.path.isdir(vault_path):
+        print(f"Generating vault {vault_path} ...")
+        temp_path = vault_path + '.partial'
+        shutil.rmtree(temp_path, ignore_errors=True)
+        generate_vault(temp_path, args.readings, args.tag_files, args.tags_per_file, args.attachments, args.depth, args.fan_out, args.links, args.seed)
+        os.replace(temp_path, vault_path)
+    return vault_path
+
+def selections(tags, count):
+    # a fixed mix of queries: one tag, two tags of one type (OR), one tag of each of two types (AND)
+    types = [tag_list for tag_list in tags.values() if tag_list]
+    queries = []
+    for i in range(count):
+        first = types[i % len(types)]
+        query = {first[i % len(first)]}
+        if i % 3 == 1 and len(first) > 1:
+            query.add(first[(i + 1) % len(first)])
+        elif i % 3 == 2 and len(types) > 1:
+            second = types[(i + 1) % len(types)]
+            query.add(second[i % len(second)])
+        queries.append(query)
+    return queries
+
+# every stage takes the shared context and returns nothing; later stages use what earlier ones stored in it
+
+def stage_tag_load(ctx):
+    from catalog import load_tags
+    ctx['tags'], _ = load_tags(ctx['vault'], {})
+
+def stage_scan_md_files(ctx):
+    from scanner import scan_md_files
+    ctx['md_files'] = scan_md_files(os.path.join(ctx['vault'], 'Readings'))
+
+def stage_process_md_file(ctx):
+    from reading import process_md_file
+    readings = [process_md_file(file_path) for file_path, _ in ctx['md_files']]
+    for reading, (_, signature) in zip(readings, ctx['md_files']):
+        reading.signature = signature
+    ctx['readings'] = readings
+
+def stage_parse_parallel(ctx):
+    from scanner import parse_md_files, DEFAULT_SCAN_WORKERS
+    parse_md_files([file_path for file_path, _ in ctx['md_files']], workers=DEFAULT_SCAN_WORKERS)
+
+def stage_catalog_cold(ctx):
+    from catalog import load_catalog
+    load_catalog(ctx['vault'], rebuild=True)
+
+def stage_catalog_warm(ctx):
+    from catalog import load_catalog
+    load_catalog(ctx['vault'])
+
+def stage_build_dataframe(ctx):
+    from catalog import build_dataframe
+    ctx['df'] = build_dataframe(ctx['tags'], ctx['readings'])
+
+def stage_tag_index_build(ctx):
+    from tag_index import TagIndex
+    ctx['tag_index'] = TagIndex(ctx['df'], ctx['tags'])
+
+def stage_filter_dataframe(ctx):
+    from tag_index import filter_dataframe
+    for selected in ctx['queries']:
+        filter_dataframe(ctx['df'], selected, ctx['tag_index'].tag_to_type)
+
+def stage_filter_tag_index(ctx):
+    from tag_index import filter_dataframe
+    ctx['tag_index']._group_masks.clear()
+    for selected in ctx['queries']:
+        filter_dataframe(ctx['df'], selected, ctx['tag_index'].tag_to_type, ctx['tag_index'])
+
+def stage_facet_counts(ctx):
+    ctx['tag_index']._group_masks.clear()
+    for selected in ctx['queries']:
+        ctx['tag_index'].facet_counts(selected)
+
+def stage_search_format(ctx):
+    # what search_and_display does off the Tk thread, plus formatting every result row
+    from export import search_readings
+    from results import format_results
+    for selected in ctx['queries']:
+        sorted_df = search_readings(ctx['df'], selected, ctx['tag_index'].tag_to_type, ctx['tag_index'])
+        format_results(sorted_df, sorted(selected), 0, len(sorted_df))
+
+def export_stage(ctx, embed_mode):
+    from export import export_readings
+    from render_cache import RenderCache
+    from attachments import AttachmentIndex
+    if 'attachment_index' not in ctx:
+        ctx['attachment_index'] = AttachmentIndex(ctx['vault']).refresh()
+    config = {'EmbedMode': embed_mode, 'RenderWorkers': ctx['render_workers']}
+    export_df = ctx['df'].iloc[:ctx['export_readings']]
+    # a cold render cache every run, so the raster numbers include rendering
+    with tempfile.TemporaryDirectory() as temp_dir:
+        export_readings(export_df, os.path.join(temp_dir, 'out.pdf'), ctx['vault'], config,
+                        RenderCache(os.path.join(temp_dir, 'renders'), max_bytes=None), ctx['attachment_index'])
+        ctx['export_bytes_' + embed_mode] = os.path.getsize(os.path.join(temp_dir, 'out.pdf'))
+
+def stage_export_vector(ctx):
+    export_stage(ctx, 'vector')
+
+def stage_export_raster(ctx):
+    export_stage(ctx, 'raster')
+
+def stage_write_back(ctx):
+    from writeback import write_back_dates
+    from storage import file_signature
+    export_df = ctx['df'].iloc[:ctx['export_readings']]
+    with tempfile.TemporaryDirectory() as temp_dir:
+        entries = []
+        for i, path in enumerate(export_df['path'].astype(str)):
+            copy = os.path.join(temp_dir, f"{i}.md")
+            shutil.copyfile(path, copy)
+            entries.append((copy, file_signature(copy)))
+        started = time.perf_counter()
+        write_back_dates(entries, datetime.now().strftime('%Y-%m-%d'))
+        # only the write-back itself counts, not making the copies
+        ctx['write_back_seconds'] = time.perf_counter() - started
+
+STAGES = [
+    ('tag_load', stage_tag_load),
+    ('scan_md_files', stage_scan_md_files),
+    ('process_md_file', stage_process_md_file),
+    ('parse_parallel', stage_parse_parallel),
+    ('catalog_cold', stage_catalog_cold),
+    ('catalog_warm', stage_catalog_warm),
+    ('build_dataframe', stage_build_dataframe),
+    ('tag_index_build', stage_tag_index_build),
+    ('filter_dataframe', stage_filter_dataframe),
+    ('filter_tag_index', stage_filter_tag_index),
+    ('facet_counts', stage_facet_counts),
+    ('search_format', stage_search_format),
+    ('export_vector', stage_export_vector),
+    ('export_raster', stage_export_raster),
+    ('write_back', stage_write_back),
+]
+
+def run_stages(ctx, repeat, only=None):
+    stages = {}
+    for name, stage in STAGES:
+        runs = []
+        for _ in range(repeat):
+            # the app prints a lot while scanning and exporting
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                started = time.perf_counter()
+                stage(ctx)
+                elapsed = ctx.pop('write_back_seconds', time.perf_counter() - started)
+            runs.append(elapsed)
+        if only and name not in only:
+            continue # still run, since later stages need what it builds
+        stages[name] = {'min': min(runs), 'median': statistics.median(runs), 'runs': runs}
+        print(f"{name:18s} min {min(runs) * 1000:10.2f} ms   median {statistics.median(runs) * 1000:10.2f} ms")
+    return stages
+
+def compare(results, baseline, tolerance, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """Print current vs baseline per stage; returns the names of the stages slower than baseline * (1 + tolerance)
+    (and by at least min_delta_ms)."""
+    if baseline['params'] != results['params']:
+        print("Warning: the baseline was recorded with different vault parameters; the comparison is not meaningful.")
+    regressions = []
+    print(f"\n{'stage':18s} {'baseline':>12s} {'current':>12s} {'ratio':>8s}")
+    for name, current in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            print(f"{name:18s} {'-':>12s} {current['min'] * 1000:10.2f}ms {'new':>8s}")
+            continue
+        ratio = current['min'] / base['min'] if base['min'] else float('inf')
+        flag = ''
+        if ratio > 1 + tolerance and (current['min'] - base['min']) * 1000 >= min_delta_ms:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:18s} {base['min'] * 1000:10.2f}ms {current['min'] * 1000:10.2f}ms {ratio:8.2f}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time every stage of the app against a synthetic vault")
+    add_arguments(parser)
+    parser.add_argument("--vault", help="Use this vault instead of generating one")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the minimum is compared")
+    parser.add_argument("--queries", type=int, default=20, help="Tag selections used by the filter/search stages")
+    parser.add_argument("--export-readings", type=int, default=50, help="Readings exported by the export/write-back stages")
+    parser.add_argument("--render-workers", type=int, default=1, help="RenderWorkers for the raster export")
+    parser.add_argument("--stages", help="Comma separated stages to report (all stages still run)")
+    parser.add_argument("--output", default='benchmark_results.json', help="Where to write the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline results to compare with")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="Ignore slowdowns smaller than this")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed slowdown before a stage counts as a regression (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    ctx = {
+        'vault': vault_for(args),
+        'render_workers': args.render_workers,
+        'export_readings': args.export_readings,
+    }
+    stage_tag_load(ctx)
+    ctx['queries'] = selections(ctx['tags'], args.queries)
+
+    params = {name: getattr(args, name) for name in ('readings', 'tag_files', 'tags_per_file', 'attachments', 'depth', 'fan_out', 'links', 'seed', 'queries', 'export_readings', 'render_workers')}
+    if args.vault:
+        params['vault'] = os.path.abspath(args.vault)
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'params': params,
+        'stages': run_stages(ctx, args.repeat, set(args.stages.split(',')) if args.stages else None),
+    }
+    results['export_bytes'] = {mode: ctx[f'export_bytes_{mode}'] for mode in ('vector', 'raster') if f'export_bytes_{mode}' in ctx}
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.isfile(args.baseline):
+        print("No baseline to compare with; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"\nRegressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
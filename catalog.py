@@ -0,0 +1,268 @@
+import os
+import json
+import warnings
+from datetime import datetime
+from itertools import chain
+
+import numpy as np
+import pandas as pd
+
+from reading import Reading, tag_vocabulary, NO_PRACTICE_DAY
+from util import extract_tags
+from tag_index import TagIndex
+from storage import vault_cache_dir, atomic_write_text, file_signature
+from scanner import DEFAULT_SCAN_WORKERS, scan_md_files, parse_md_files
+from instrument import traced, count
+
+# bump whenever the layout of catalog.json changes; older caches are discarded on load
+CATALOG_VERSION = 3
+CATALOG_FILE_NAME = 'catalog.json'
+# readings without a "Last Practice Date" line are treated as never practiced
+DEFAULT_PRACTICE_DATE = '2000-01-01'
+
+def catalog_path(vault_path):
+    return os.path.join(vault_cache_dir(vault_path), CATALOG_FILE_NAME)
+
+def read_catalog_cache(vault_path):
+    # returns an empty cache if the file is missing, unreadable or from another format version
+    empty = {'version': CATALOG_VERSION, 'vault': os.path.abspath(vault_path), 'tags': {}, 'readings': {}}
+    path = catalog_path(vault_path)
+    if not os.path.isfile(path):
+        return empty
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Discarding unreadable catalog cache '{path}': {e}")
+        return empty
+    if not isinstance(cache, dict) or cache.get('version') != CATALOG_VERSION or cache.get('vault') != empty['vault']:
+        warnings.warn(f"Discarding incompatible catalog cache '{path}'.")
+        return empty
+    return cache
+
+def write_catalog_cache(vault_path, cache):
+    atomic_write_text(catalog_path(vault_path), json.dumps(cache))
+
+def load_tags(vault_path, cached_tags):
+    # tag type (file name without extension) -> list of tags, re-reading only changed tag files
+    tags = {}
+    fresh_cache = {}
+    tag_folder_path = os.path.join(vault_path, 'Tags')
+    tag_files = [f for f in os.listdir(tag_folder_path) if os.path.isfile(os.path.join(tag_folder_path, f))]
+    for file in tag_files:
+        file_path = os.path.join(tag_folder_path, file)
+        signature = file_signature(file_path)
+        entry = cached_tags.get(file)
+        if entry and entry[:2] == signature:
+            tag_list = entry[2]
+        else:
+            tag_list = extract_tags(file_path)
+        fresh_cache[file] = signature + [tag_list]
+        tags[file.split('.')[0]] = list(tag_list)
+        tag_vocabulary.extend(tag_list)
+    return tags, fresh_cache
+
+def reading_to_entry(signature, reading):
+    date_str = reading.last_practice_date.strftime('%Y-%m-%d') if reading.last_practice_date else None
+    return signature + [reading.name, reading.tags, date_str, reading.body_offset]
+
+def entry_to_reading(file_path, entry):
+    name, tags, date_str, body_offset = entry[2:]
+    last_practice_date = datetime.strptime(date_str, '%Y-%m-%d') if date_str else None
+    return Reading(name, tags, last_practice_date, file_path, body_offset)
+
+@traced('catalog_load')
+def load_catalog(vault_path, rebuild=False, workers=DEFAULT_SCAN_WORKERS, use_processes=False):
+    """Return (tags, readings, errors) for the vault, re-parsing only files that are new or whose mtime/size changed.
+
+    Pass rebuild=True to ignore the on-disk cache and parse every file again. Changed files are parsed on a
+    pool of `workers` threads (or processes); errors is a list of (file_path, message) for files that failed.
+    """
+    if rebuild:
+        cache = {'version': CATALOG_VERSION, 'vault': os.path.abspath(vault_path), 'tags': {}, 'readings': {}}
+    else:
+        cache = read_catalog_cache(vault_path)
+
+    tags, tag_cache = load_tags(vault_path, cache['tags'])
+
+    # recursively process all file in folder "Readings" of the vault (and maybe subfolder of reading); ones that ends with .md
+    readings_folder_path = os.path.join(vault_path, 'Readings')
+    cached_readings = cache['readings']
+    md_files = scan_md_files(readings_folder_path)
+
+    stale_paths = []
+    for file_path, signature in md_files:
+        entry = cached_readings.get(os.path.relpath(file_path, vault_path))
+        if not entry or entry[:2] != signature:
+            stale_paths.append(file_path)
+    parsed_readings, errors = parse_md_files(stale_paths, workers=workers, use_processes=use_processes)
+    parsed = {reading.file_path: reading for reading in parsed_readings}
+
+    reading_cache = {}
+    readings = []
+    for file_path, signature in md_files:
+        key = os.path.relpath(file_path, vault_path)
+        if file_path in parsed:
+            reading = parsed[file_path]
+        elif cached_readings.get(key) and cached_readings[key][:2] == signature:
+            reading = entry_to_reading(file_path, cached_readings[key])
+        else:
+            continue # failed to parse; left out of the cache so it is retried next time
+        reading.signature = signature
+        reading_cache[key] = reading_to_entry(signature, reading)
+        readings.append(reading)
+
+    removed = len(set(cached_readings) - set(reading_cache))
+    count('readings_cached', len(readings) - len(parsed))
+    print(f"Catalog: {len(readings)} readings ({len(parsed)} parsed, {len(readings) - len(parsed)} cached, {removed} removed, {len(errors)} failed)")
+
+    if rebuild or tag_cache != cache['tags'] or reading_cache != cached_readings:
+        cache['tags'] = tag_cache
+        cache['readings'] = reading_cache
+        write_catalog_cache(vault_path, cache)
+    return tags, readings, errors
+
+class LiveCatalog:
+    """The loaded catalog, kept in sync with the vault while the app runs.
+
+    apply_changes() takes a batch of changed paths (from the watcher thread), re-parses only the readings
+    whose mtime/size changed, drops deleted ones and builds the new frame and tag index in one go.
+    It returns an update that commit() publishes on the Tk thread, so searches never see a frame and
+    a tag index from different generations.
+    """
+
+    def __init__(self, vault_path, tags, readings, workers=DEFAULT_SCAN_WORKERS, use_processes=False):
+        self.vault_path = os.path.abspath(vault_path)
+        self.readings_folder = os.path.join(self.vault_path, 'Readings')
+        self.tags_folder = os.path.join(self.vault_path, 'Tags')
+        self.workers = workers
+        self.use_processes = use_processes
+        # owned by the thread calling apply_changes
+        self.readings = {os.path.abspath(reading.file_path): reading for reading in readings}
+        self.loaded_tags, self.tag_cache = load_tags(self.vault_path, {})
+        # published state, read by the GUI
+        self.tags = tags
+        self.df = build_dataframe(tags, readings)
+        self.tag_index = TagIndex(self.df, tags)
+        # practice log (history.PracticeHistory), applied to every frame built from the notes once it is set
+        self.history = None
+
+    def in_folder(self, path, folder):
+        return path == folder or path.startswith(folder + os.sep)
+
+    def reading_candidates(self, paths):
+        # .md paths below Readings/ affected by the batch; a folder (or a vanished path) stands for everything below it
+        candidates = set()
+        for path in paths:
+            if not self.in_folder(path, self.readings_folder):
+                continue
+            if path.endswith('.md') and not os.path.isdir(path):
+                candidates.add(path)
+                continue
+            candidates.update(file_path for file_path in self.readings if self.in_folder(file_path, path))
+            if os.path.isdir(path):
+                candidates.update(file_path for file_path, _ in scan_md_files(path))
+        return candidates
+
+    @traced('catalog_update')
+    def apply_changes(self, paths, rescan=False):
+        """Apply a batch of changed paths; returns (update, errors), update being None when nothing changed."""
+        paths = {os.path.abspath(path) for path in paths}
+        tags_changed = rescan or any(self.in_folder(path, self.tags_folder) for path in paths)
+        candidates = {file_path for file_path, _ in scan_md_files(self.readings_folder)} | set(self.readings) if rescan else self.reading_candidates(paths)
+
+        stale = []
+        removed = []
+        signatures = {}
+        for file_path in candidates:
+            try:
+                signatures[file_path] = file_signature(file_path)
+            except (FileNotFoundError, NotADirectoryError):
+                if file_path in self.readings:
+                    removed.append(file_path)
+                continue
+            reading = self.readings.get(file_path)
+            if reading is None or reading.signature != signatures[file_path]:
+                stale.append(file_path)
+
+        parsed, errors = parse_md_files(sorted(stale), workers=self.workers, use_processes=self.use_processes)
+        for file_path in removed:
+            del self.readings[file_path]
+        for reading in parsed:
+            reading.signature = signatures[reading.file_path]
+            self.readings[os.path.abspath(reading.file_path)] = reading
+        failed = [file_path for file_path, _ in errors if file_path in self.readings]
+        for file_path in failed:
+            del self.readings[file_path] # keep the catalog in line with what is on disk
+
+        tags = self.loaded_tags
+        if tags_changed:
+            tags, self.tag_cache = load_tags(self.vault_path, self.tag_cache)
+            tags_changed = tags != self.loaded_tags
+            self.loaded_tags = tags
+        if not (parsed or removed or failed or tags_changed):
+            return None, errors
+
+        print(f"Catalog: {len(parsed)} readings updated, {len(removed) + len(failed)} removed{', tags reloaded' if tags_changed else ''}")
+        readings = [self.readings[file_path] for file_path in sorted(self.readings)]
+        self.save(readings)
+        df = build_dataframe(tags, readings)
+        if self.history is not None:
+            self.history.apply_dates(df)
+        # the GUI sorts the tag lists it is given, so it gets its own copies
+        tags = {tag_type: list(tag_list) for tag_type, tag_list in tags.items()}
+        return (tags, df, TagIndex(df, tags)), errors
+
+    def save(self, readings):
+        cache = {'version': CATALOG_VERSION, 'vault': self.vault_path, 'tags': self.tag_cache, 'readings': {
+            os.path.relpath(reading.file_path, self.vault_path): reading_to_entry(reading.signature, reading) for reading in readings
+        }}
+        write_catalog_cache(self.vault_path, cache)
+
+    def commit(self, update):
+        # Tk thread only
+        self.tags, self.df, self.tag_index = update
+
+@traced('catalog_build')
+def build_dataframe(tags, readings):
+    """Build the catalog frame in one pass: one row per reading, one bool column per tag."""
+    # convert readings to pandas dataframe with one-hot columns for all potential tags
+    tags_lst = list(dict.fromkeys(tag for tag_list in tags.values() for tag in tag_list))
+    tag_positions = {tag: i for i, tag in enumerate(tags_lst)}
+
+    n = len(readings)
+    # readings hold their tags as tag_vocabulary ids: map every id to its column (-1: not a tag from Tags/)
+    tag_ids = [reading.tag_ids for reading in readings]
+    flat_ids = np.fromiter(chain.from_iterable(tag_ids), dtype=np.int64)
+    rows = np.repeat(np.arange(n), np.fromiter(map(len, tag_ids), dtype=np.int64, count=n))
+    tag_vocabulary.extend(tags_lst)
+    id_positions = np.full(len(tag_vocabulary.names), -1, dtype=np.int64)
+    for tag, position in tag_positions.items():
+        id_positions[tag_vocabulary.ids[tag]] = position
+    positions = id_positions[flat_ids]
+    known = positions >= 0
+    membership = np.zeros((len(tags_lst), n), dtype=bool)
+    membership[positions[known], rows[known]] = True
+
+    days = np.fromiter((reading.practice_day for reading in readings), dtype=np.int64, count=n)
+    dates = np.where(days == NO_PRACTICE_DAY, np.datetime64(DEFAULT_PRACTICE_DATE, 'D'), days.astype('datetime64[D]')).astype('datetime64[s]')
+
+    # the tag list as exported ("['a', 'b']"), one category per distinct list
+    labels = {ids: str(tag_vocabulary.lookup(ids)) for ids in set(tag_ids)}
+    columns = {
+        "name": pd.Categorical([reading.name for reading in readings]),
+        "last_practice_date": dates,
+        "tags": pd.Categorical([labels[ids] for ids in tag_ids]),
+    }
+    for tag, position in tag_positions.items():
+        columns[tag] = membership[position]
+    columns["body_offset"] = np.fromiter((reading.body_offset for reading in readings), dtype=np.int64, count=n)
+    columns["path"] = pd.Categorical([reading.file_path for reading in readings])
+    # file state at scan time, so write-back can tell when a note was edited in the meantime
+    columns["mtime_ns"] = np.fromiter((reading.signature[0] for reading in readings), dtype=np.int64, count=n)
+    columns["size"] = np.fromiter((reading.signature[1] for reading in readings), dtype=np.int64, count=n)
+    return pd.DataFrame(columns, index=pd.RangeIndex(n))
+
+def catalog_memory_report(df):
+    # bytes used by each column of the catalog, largest first
+    return df.memory_usage(index=False, deep=True).sort_values(ascending=False)
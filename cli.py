@@ -0,0 +1,232 @@
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import multiprocessing
+import warnings
+from datetime import datetime, timedelta
+
+from catalog import load_catalog, LiveCatalog
+from scanner import DEFAULT_SCAN_WORKERS
+from attachments import AttachmentIndex
+from history import open_history
+from settings import load_config
+from instrument import enable_tracing, disable_tracing, span, profile
+from scheduler import schedule_readings, reading_minutes
+from export import default_cutoff, open_render_cache, open_export_cache, search_readings, select_for_export, export_readings, choose_output_path, write_back
+
+# Headless batch export: the same scan -> filter -> export -> write-back pipeline as the GUI, without tkinter
+# or prompts. Every job prints one JSON object (a line) with its result; progress and diagnostics go to stderr.
+#
+#   music-practice-cli --vault ~/Sightreading --tags beginner etude --cutoff 2024-01-01
+#   music-practice-cli --vault ~/Sightreading --jobs nightly.json --output-dir books/
+#
+# A jobs file is a JSON list (or one JSON object per line) of {"tags": [...], "cutoff": "YYYY-MM-DD",
+# "budget": minutes, "vault": ..., "output": ..., "output_dir": ..., "write_back": true/false, "name": ...}; missing keys
+# fall back to the command line options. Catalogs and caches are loaded once per vault and shared by all jobs.
+# With a budget the readings are chosen by the scheduler (scheduler.py) instead of the cutoff date.
+
+class BatchSession:
+    # loaded vaults and the render cache, kept for all jobs of one run
+    def __init__(self, config, rebuild=False):
+        self.config = config
+        self.rebuild = rebuild
+        self.vaults = {}
+        self.render_cache = None
+        self.export_cache = None
+
+    def vault(self, vault_path):
+        key = os.path.abspath(vault_path)
+        if key not in self.vaults:
+            tags, readings, errors = load_catalog(
+                vault_path,
+                rebuild=self.rebuild,
+                workers=self.config.get('ScanWorkers', DEFAULT_SCAN_WORKERS),
+                use_processes=self.config.get('ScanExecutor') == 'process'
+            )
+            for file_path, error in errors:
+                warnings.warn(f"Could not parse '{file_path}': {error}")
+            attachment_index = AttachmentIndex.load(vault_path).refresh()
+            attachment_index.save()
+            catalog = LiveCatalog(vault_path, tags, readings)
+            catalog.history = open_history(vault_path, catalog.df)
+            self.vaults[key] = (catalog, attachment_index)
+        return self.vaults[key]
+
+    def get_render_cache(self):
+        if self.render_cache is None:
+            self.render_cache = open_render_cache(self.config)
+        return self.render_cache
+
+    def get_export_cache(self):
+        if self.export_cache is None:
+            self.export_cache = open_export_cache(self.config)
+        return self.export_cache
+
+    def run(self, job, dry_run=False):
+        """Run one job (a dict, see above) and return its result as a JSON-serialisable dict."""
+        started = time.perf_counter()
+        selected = list(job.get('tags') or [])
+        cutoff = job.get('cutoff') or default_cutoff()
+        result = {'job': job.get('name'), 'vault': job.get('vault'), 'tags': selected, 'cutoff': cutoff}
+        try:
+            if not job.get('vault'):
+                raise ValueError("No vault path given.")
+            if not selected:
+                raise ValueError("No tags selected.")
+            datetime.strptime(cutoff, '%Y-%m-%d')
+            catalog, attachment_index = self.vault(job['vault'])
+            tag_to_type = catalog.tag_index.tag_to_type
+            unknown = [tag for tag in selected if tag not in tag_to_type]
+            if unknown:
+                raise ValueError(f"Unknown tags: {unknown}")
+
+            searched_df = search_readings(catalog.df, set(selected), tag_to_type, catalog.tag_index)
+            if job.get('budget') is not None:
+                filtered_df = schedule_readings(searched_df, self.config, float(job['budget']))
+                result['budget'] = job['budget']
+                result['minutes'] = float(reading_minutes(filtered_df, self.config).sum())
+            else:
+                filtered_df = select_for_export(searched_df, cutoff)
+            result['pieces'] = len(filtered_df)
+            result['readings'] = [
+                {'name': str(name), 'path': str(path), 'last_practice_date': date.strftime('%Y-%m-%d')}
+                for name, path, date in zip(filtered_df['name'], filtered_df['path'], filtered_df['last_practice_date'])
+            ]
+            if filtered_df.empty or dry_run:
+                result['status'] = 'empty' if filtered_df.empty else 'dry-run'
+                return result
+
+            current_time_str = datetime.now().strftime('%Y-%m-%d')
+            output_pdf_path = job.get('output') or choose_output_path(selected, current_time_str, job.get('output_dir') or '')
+            if os.path.dirname(output_pdf_path):
+                os.makedirs(os.path.dirname(output_pdf_path), exist_ok=True)
+            outputs = export_readings(filtered_df, output_pdf_path, job['vault'], self.config, self.get_render_cache(), attachment_index, export_cache=self.get_export_cache())
+            result['output'] = output_pdf_path
+            if len(outputs) > 1:
+                result['volumes'] = outputs
+
+            if job.get('write_back', True):
+                counts = {}
+                for status, *_ in write_back(catalog.df, filtered_df, current_time_str, self.config, catalog.history).values():
+                    counts[status] = counts.get(status, 0) + 1
+                result['write_back'] = counts
+            result['status'] = 'ok'
+        except Exception as e:
+            result['status'] = 'error'
+            result['error'] = f"{type(e).__name__}: {e}"
+        finally:
+            result['seconds'] = round(time.perf_counter() - started, 3)
+        return result
+
+def history_report(session, vault_path, selected, since, neglected=10):
+    # practice totals from the vault's log, without opening any note
+    catalog, _ = session.vault(vault_path)
+    df = catalog.df
+    if selected:
+        df = search_readings(df, set(selected), catalog.tag_index.tag_to_type, catalog.tag_index)
+    tags = [tag for tag_list in catalog.tags.values() for tag in tag_list]
+    return {
+        'vault': vault_path,
+        'since': since,
+        'events': len(catalog.history),
+        'tag_counts': catalog.history.tag_counts(df, tags, since),
+        'weekly': {week.strftime('%Y-%m-%d'): int(total) for week, total in catalog.history.weekly_totals(df, since).items()},
+        'longest_neglected': [
+            {'name': str(name), 'path': str(path), 'last_practice_date': date.strftime('%Y-%m-%d')}
+            for name, path, date in zip(*(catalog.history.longest_neglected(df, neglected)[column] for column in ('name', 'path', 'last_practice_date')))
+        ],
+    }
+
+def read_jobs(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Music Practice Selector & Tracker: headless batch export")
+    parser.add_argument("--vault", help="Vault path (default: VaultPath from the config)")
+    parser.add_argument("--tags", nargs='+', default=[], help="Tags to select (same-type tags are OR-ed, types are AND-ed)")
+    parser.add_argument("--cutoff", help="Export pieces last practiced before this date, YYYY-MM-DD (default: 10 days ago)")
+    parser.add_argument("--budget", type=float, help="Practice minutes: let the scheduler pick the readings instead of --cutoff (default: ScheduleBudgetMinutes, unless --cutoff is given)")
+    parser.add_argument("--jobs", help="JSON file with a list of jobs, run one after another in this process")
+    parser.add_argument("--output", help="Output PDF path (single job)")
+    parser.add_argument("--output-dir", default='', help="Folder for the generated PDFs")
+    parser.add_argument("--history", action="store_true", help="Print practice totals from the practice log (since --since, for --tags if given) and exit")
+    parser.add_argument("--since", help="Start of the --history period, YYYY-MM-DD (default: 30 days ago)")
+    parser.add_argument("--no-write-back", action="store_true", help="Do not write the practice date back into the notes")
+    parser.add_argument("--dry-run", action="store_true", help="Only report the matching readings; no PDF, no write-back")
+    parser.add_argument("--rebuild-catalog", action="store_true", help="Ignore the catalog cache and re-parse every reading")
+    parser.add_argument("--config", help="Settings file to use instead of the per-user config.json")
+    parser.add_argument("--results", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--trace", help="Append timing spans and counters to this JSON-lines file")
+    parser.add_argument("--profile", help="Profile each job into this file (the job name is added when there are several)")
+    parser.add_argument("--profile-mode", choices=['cprofile', 'sampling'], default='cprofile')
+    args = parser.parse_args(argv)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        config = load_config(args.config)
+    defaults = {
+        'vault': args.vault or config.get('VaultPath'),
+        'tags': args.tags,
+        'cutoff': args.cutoff,
+        # an explicit cutoff wins over ScheduleBudgetMinutes
+        'budget': args.budget if args.budget is not None or args.cutoff else config.get('ScheduleBudgetMinutes'),
+        'output_dir': args.output_dir,
+        'write_back': not args.no_write_back,
+    }
+    if args.jobs:
+        jobs = []
+        for job in read_jobs(args.jobs):
+            if 'cutoff' in job and 'budget' not in job and args.budget is None:
+                job = {**job, 'budget': None} # same for a job's own cutoff
+            jobs.append({**defaults, **job})
+    else:
+        jobs = [{**defaults, 'output': args.output}]
+
+    if args.history:
+        if not defaults['vault']:
+            print("No vault path given.", file=sys.stderr)
+            return 1
+        since = args.since or (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        with contextlib.redirect_stdout(sys.stderr):
+            report = history_report(BatchSession(config, rebuild=args.rebuild_catalog), defaults['vault'], args.tags, since)
+        print(json.dumps(report))
+        return 0
+
+    trace_path = args.trace or config.get('TracePath')
+    if trace_path:
+        enable_tracing(trace_path)
+    results_file = open(args.results, 'w', encoding='utf-8') if args.results else sys.stdout
+    session = BatchSession(config, rebuild=args.rebuild_catalog)
+    failed = 0
+    try:
+        for number, job in enumerate(jobs):
+            job.setdefault('name', number)
+            if args.profile:
+                root, extension = os.path.splitext(args.profile)
+                profiler = profile(f"{root}_{job['name']}{extension}" if len(jobs) > 1 else args.profile, args.profile_mode)
+            else:
+                profiler = contextlib.nullcontext()
+            # the pipeline prints progress; keep stdout for the results
+            with contextlib.redirect_stdout(sys.stderr), profiler, span('job', job=job['name']):
+                result = session.run(job, dry_run=args.dry_run)
+            failed += result['status'] == 'error'
+            results_file.write(json.dumps(result) + '\n')
+            results_file.flush()
+    finally:
+        if results_file is not sys.stdout:
+            results_file.close()
+        disable_tracing()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    # needed for the render worker processes in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+
+    sys.exit(main())
@@ -0,0 +1,270 @@
+import os
+import shutil
+import tempfile
+import functools
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from reading import body_cache
+from util import convert_markdown_to_pdf, attachment_links, can_embed_pdf
+from storage import user_cache_dir
+from render_cache import RenderCache, DEFAULT_RENDER_CACHE_BYTES
+from export_cache import ExportCache, DEFAULT_EXPORT_CACHE_BYTES, reading_key, export_key
+from image_pipeline import image_settings
+from pdf_writer import DEFAULT_EXPORT_MEMORY_BYTES, estimate_reading_bytes, plan_chunks, plan_volumes, volume_paths, iter_segments, page_sizes, write_volume
+from tag_index import filter_dataframe
+from writeback import write_back_dates, apply_write_back, DEFAULT_WRITE_BACK_WORKERS
+from instrument import traced, span, count
+
+# the search -> export -> write-back pipeline, shared by the GUI (app.py) and the batch command (cli.py);
+# nothing in here may import tkinter
+
+# without a cutoff, pieces not practiced in the last 10 days are exported
+DEFAULT_CUTOFF_DAYS = 10
+
+def default_cutoff():
+    return (datetime.now() - timedelta(days=DEFAULT_CUTOFF_DAYS)).strftime('%Y-%m-%d')
+
+def open_render_cache(config):
+    # rendered pages are shared between exports (and vaults) in the per-user cache folder
+    return RenderCache(
+        os.path.join(user_cache_dir(), 'renders'),
+        max_bytes=config.get('RenderCacheBytes', DEFAULT_RENDER_CACHE_BYTES)
+    )
+
+def open_export_cache(config):
+    # finished exports and per-reading segments, reused when the same readings are exported again; None when "ExportCache" is false
+    if not config.get('ExportCache', True):
+        return None
+    return ExportCache(
+        os.path.join(user_cache_dir(), 'exports'),
+        max_bytes=config.get('ExportCacheBytes', DEFAULT_EXPORT_CACHE_BYTES)
+    )
+
+@traced('search')
+def search_readings(df, selected, tag_to_type, tag_index=None):
+    # readings matching the selected tags, least recently practiced first
+    filtered_df = filter_dataframe(df, selected, tag_to_type, tag_index)
+    return filtered_df.sort_values(by=['last_practice_date', 'name'], ascending=True)
+
+def select_for_export(searched_df, cutoff_str):
+    # only the readings not practiced since the cutoff date
+    cutoff = datetime.strptime(cutoff_str, '%Y-%m-%d')
+    return searched_df[searched_df['last_practice_date'] < cutoff]
+
+def choose_output_path(selected_tags, date_str, directory=''):
+    # output_<tags>_<date>.pdf, with _1, _2, ... appended when that file already exists
+    selected_tags_str = '_'.join(selected_tags)
+    output_pdf_path_template = os.path.join(directory, 'output_{selected_tags_str}_{current_time_str}{tail}.pdf'.format(selected_tags_str=selected_tags_str, current_time_str=date_str, tail="{}"))
+    output_pdf_path = output_pdf_path_template.format("")
+    i = 1
+    while os.path.exists(output_pdf_path):
+        output_pdf_path = output_pdf_path_template.format("_" + str(i))
+        i += 1
+    return output_pdf_path
+
+@traced('export')
+def export_readings(filtered_df, output_pdf_path, vault_path, config, render_cache, attachment_index, progress=None, export_cache=None):
+    """Render the readings of filtered_df (in order) into output_pdf_path.
+
+    progress(done, total, status) is called once per reading; it may raise to abort before anything is written.
+    Returns the paths written: output_pdf_path, or output_pdf_path_vol1.pdf, ... when the export is split into
+    volumes. With an export_cache (see export_cache.py) a repeated export is linked from the cache and only
+    readings whose text or attachments changed are rendered again. Nothing is written (and [] returned) when
+    filtered_df is empty.
+    """
+    if filtered_df.empty:
+        return []
+    names = list(filtered_df['name'].astype(str))
+
+    # pick up attachments added since the index was loaded; only folders whose mtime changed are listed again
+    attachment_index.refresh().save()
+
+    md_strings = []
+    for index, row in filtered_df.iterrows():
+        # the catalog only knows where each body starts; the text is read from the note now
+        body = body_cache.get(row['path'], row['body_offset'], (row['mtime_ns'], row['size']))
+        md_string = f"Name: {row['name']}\nTags: {row['tags']}\nLast Practice Date: {row['last_practice_date'].strftime('%Y-%m-%d')}\n\n{body}"
+        md_strings.append(md_string)
+
+    settings = {
+        'embed_mode': config.get('EmbedMode', 'vector'),
+        'pdf_margin': config.get('EmbedMargin', 40),
+        'pdf_scale': config.get('EmbedScale'),
+        'image_settings': image_settings(config),
+    }
+    image_stats = {}
+
+    def render(indices, pdf_path, chunk_progress=None):
+        # render the readings `indices` into pdf_path; returns the page count of each
+        return convert_markdown_to_pdf(
+            [md_strings[i] for i in indices], vault_path, pdf_path,
+            **settings,
+            render_cache=render_cache,
+            render_workers=config.get('RenderWorkers', os.cpu_count() or 1),
+            attachment_index=attachment_index,
+            progress=chunk_progress,
+            titles=[names[i] for i in indices],
+            image_stats=image_stats
+        )
+
+    outputs = write_export(md_strings, names, output_pdf_path, config, settings, attachment_index, render, progress, export_cache)
+    saved = image_stats.get('source_bytes', 0) - image_stats.get('output_bytes', 0)
+    if saved > 0:
+        count('image_bytes_saved', saved)
+        print(f"Images: {image_stats['source_bytes'] / 1e6:.1f} MB -> {image_stats['output_bytes'] / 1e6:.1f} MB ({saved / 1e6:.1f} MB saved)")
+    return outputs
+
+def write_export(md_strings, names, output_pdf_path, config, settings, attachment_index, render, progress=None, export_cache=None):
+    """Render the readings and write them as volumes, each in a single pass when it fits in ExportMemoryBytes.
+
+    A volume drawn on one canvas stores every shared image and PDF once. Only when the readings do not fit in
+    one canvas, or volume limits are set, are they rendered in chunks and cut into per-reading segments (see
+    pdf_writer.py): the segments give the page counts the volumes are planned with, and a volume that is still
+    too large for one canvas is stitched from them (storing shared attachments once per reading).
+    With an export_cache (see export_cache.py) volumes that were exported before are reused, and so are the
+    segments when volumes are planned. Returns the paths of the volumes.
+    """
+    n = len(md_strings)
+    if n == 0:
+        return []
+    attachments = []
+    for md_string in md_strings:
+        found = {}
+        for name in attachment_links(md_string):
+            paths = attachment_index.candidates(name)
+            found[name] = paths[0] if paths else None
+        attachments.append(found)
+    max_pages = config.get('ExportVolumePages')
+    max_bytes = config.get('ExportVolumeBytes')
+    budget = config.get('ExportMemoryBytes', DEFAULT_EXPORT_MEMORY_BYTES)
+    vector = settings['embed_mode'] == 'vector'
+    embeddable = functools.lru_cache(maxsize=None)(can_embed_pdf)
+
+    def plan(indices):
+        # chunks (lists of positions in indices) that fit the memory budget; a canvas stores an image once
+        seen = set()
+        return plan_chunks([estimate_reading_bytes(attachments[i], vector, embeddable, seen) for i in indices], budget)
+
+    # one progress bar over both passes: the readings rendered into chunks, then those drawn again per volume
+    tally = {'done': 0, 'total': n}
+
+    def rendered(indices, pdf_path):
+        def report(done, total):
+            if progress is not None:
+                progress(tally['done'] + done, tally['total'], names[indices[done]] if done < total else "saving")
+
+        page_counts = render(indices, pdf_path, report)
+        tally['done'] += len(indices)
+        return page_counts
+
+    def render_volume(indices, volume_path):
+        # one canvas for the whole volume; its segments go to the cache for later exports
+        page_counts = rendered(indices, volume_path)
+        if export_cache is not None:
+            for i, data in zip(indices, iter_segments(volume_path, page_counts)):
+                if export_cache.get_segment(keys[i]) is None:
+                    export_cache.put_segment(keys[i], data)
+            export_cache.put_export(export_key([keys[i] for i in indices]), volume_path)
+
+    keys = [reading_key(md_string, found, settings) for md_string, found in zip(md_strings, attachments)] if export_cache is not None else None
+    cached = export_cache.get_export(export_key(keys)) if export_cache is not None else None
+    if max_pages is None and max_bytes is None and cached is None and len(plan(range(n))) == 1:
+        # a single volume that fits in one canvas: render straight into the output
+        render_volume(list(range(n)), output_pdf_path)
+        if export_cache is not None:
+            export_cache.evict(keep={export_cache.segment_path(key) for key in keys} | {export_cache.export_path(export_key(keys))})
+        return [output_pdf_path]
+
+    segments = [export_cache.get_segment(key) for key in keys] if export_cache is not None else [None] * n
+    missing = [i for i, segment in enumerate(segments) if segment is None]
+    # until the volumes are planned, assume every reading is drawn again
+    tally['total'] = len(missing) + (n if max_pages is not None or max_bytes is not None else 0)
+    with tempfile.TemporaryDirectory(dir=export_cache.cache_dir if export_cache is not None else None) as temp_dir:
+        # readings -> the chunk file they were rendered into, so a volume that is exactly one chunk is not drawn twice
+        chunk_files = {}
+        for number, chunk in enumerate(plan(missing)):
+            indices = [missing[j] for j in chunk]
+            chunk_path = os.path.join(temp_dir, f"chunk{number}.pdf")
+            with span('render_chunk', readings=len(indices)):
+                page_counts = rendered(indices, chunk_path)
+            chunk_files[tuple(indices)] = chunk_path
+            for i, data in zip(indices, iter_segments(chunk_path, page_counts)):
+                if export_cache is not None:
+                    export_cache.put_segment(keys[i], data)
+                    segments[i] = export_cache.segment_path(keys[i])
+                else:
+                    segments[i] = os.path.join(temp_dir, f"reading{i}.pdf")
+                    with open(segments[i], 'wb') as f:
+                        f.write(data)
+        if export_cache is not None:
+            count('segments_reused', n - len(missing))
+            print(f"Export cache: {n - len(missing)} of {n} readings reused")
+
+        page_counts = [len(page_sizes(segment)) for segment in segments]
+        volumes = plan_volumes(page_counts, [os.path.getsize(segment) for segment in segments], max_pages, max_bytes)
+        outputs = volume_paths(output_pdf_path, len(volumes))
+        steps = []
+        for start, end in volumes:
+            indices = list(range(start, end))
+            volume_key = export_key(keys[start:end]) if export_cache is not None else None
+            cached = export_cache.get_export(volume_key) if export_cache is not None else None
+            if cached is not None:
+                steps.append(('cached', indices, volume_key, cached))
+            elif tuple(indices) in chunk_files:
+                steps.append(('chunk', indices, volume_key, chunk_files[tuple(indices)]))
+            elif len(plan(indices)) == 1:
+                steps.append(('render', indices, volume_key, None))
+            else:
+                steps.append(('stitch', indices, volume_key, None))
+        tally['total'] = tally['done'] + sum(len(indices) for kind, indices, _, _ in steps if kind == 'render')
+        if progress is not None and tally['done'] == tally['total']:
+            progress(n, n, "saving")
+
+        # volumes are written into the temporary folder and only moved to the output once all of them are done,
+        # so cancelling (progress raising) leaves no partial export behind
+        temp_paths = [os.path.join(temp_dir, f"volume{number}.pdf") for number in range(len(steps))]
+        for (kind, indices, volume_key, source), temp_path in zip(steps, temp_paths):
+            if kind == 'cached':
+                export_cache.copy_export(source, temp_path)
+                count('export_cache_hits')
+                continue
+            if kind == 'chunk':
+                os.replace(source, temp_path)
+            elif kind == 'render':
+                with span('render_volume', readings=len(indices)):
+                    render_volume(indices, temp_path)
+            else:
+                write_volume([(segments[i], names[i]) for i in indices], temp_path)
+            if export_cache is not None and kind != 'render':
+                export_cache.put_export(volume_key, temp_path)
+            count('pdf_bytes_written', os.path.getsize(temp_path))
+        for temp_path, volume_path in zip(temp_paths, outputs):
+            shutil.move(temp_path, volume_path)
+    if export_cache is not None:
+        export_cache.evict(keep=set(segments) | {export_cache.export_path(export_key(keys[start:end])) for start, end in volumes})
+    if len(outputs) > 1:
+        print(f"Export split into {len(outputs)} volumes: {outputs}")
+    return outputs
+
+def write_back_entries(filtered_df):
+    # (file_path, [mtime_ns, size]) of every exported reading, for writeback.write_back_dates
+    return list(zip(filtered_df['path'].astype(str), filtered_df[['mtime_ns', 'size']].values.tolist()))
+
+def mark_practiced(df, paths, date_str):
+    # by path rather than index label, so the rows are found in a frame rebuilt since the search
+    df.loc[df['path'].astype(str).isin(list(paths)), 'last_practice_date'] = pd.Timestamp(date_str)
+
+def record_practice(history, filtered_df, date_str):
+    # one event per exported reading in the vault's practice log (see history.py)
+    if history is not None:
+        history.record(filtered_df['path'].astype(str), date_str)
+
+def write_back(df, filtered_df, date_str, config, history=None):
+    """Write date_str into the exported notes, the practice log and the catalog, in the calling thread; returns the per-file results."""
+    record_practice(history, filtered_df, date_str)
+    results = write_back_dates(write_back_entries(filtered_df), date_str, workers=config.get('WriteBackWorkers', DEFAULT_WRITE_BACK_WORKERS))
+    apply_write_back(df, results)
+    mark_practiced(df, filtered_df['path'].astype(str), date_str)
+    return results
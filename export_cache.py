@@ -0,0 +1,171 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+
+from storage import atomic_write_bytes, atomic_write_text
+
+# Content-addressed cache of finished exports and of the pages of every single reading ("segments").
+#
+# A reading's key is a digest of its text (name, tags, date and body, as exported), the path, mtime and size
+# of every attachment it embeds, and the render settings. A volume's key (see pdf_writer.py) is a digest of
+# its reading keys in order. When the key of a volume is found, the cached PDF is copied (as a reflink where
+# the file system can) to the output path; otherwise the volume is rendered again, and the segments only spare
+# rendering the readings to plan volumes (or stitch one too large for a single canvas).
+#
+# The "Last Practice Date:" printed at the top of every reading is part of its text, so writing the export date
+# back into the notes changes their keys: exporting the same readings again after a write-back renders them
+# again (once; later exports that day match). Leaving the date out would hand out PDFs showing an old date.
+#
+#   exports/<key>.pdf (+ <key>.json: size and mtime of the file when it was stored)
+#   segments/<key>.pdf
+
+DEFAULT_EXPORT_CACHE_BYTES = 256 * 1024 * 1024
+# part of every key; bump when the rendering changes so old entries stop matching
+EXPORT_CACHE_VERSION = 2
+
+def digest(parts):
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def attachment_state(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return f"{file_path}|missing"
+    return f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+def reading_key(md_string, attachments, settings):
+    """Key of one reading: its text, its attachments ({name: path or None}) and the render settings (a dict)."""
+    parts = [str(EXPORT_CACHE_VERSION), json.dumps(settings, sort_keys=True), md_string]
+    for name, file_path in attachments.items():
+        parts.append(f"{name}={attachment_state(file_path) if file_path else 'not found'}")
+    return digest(parts)
+
+def export_key(reading_keys):
+    return digest(reading_keys)
+
+# Linux ioctl that shares the blocks of one file with another (copy-on-write) on btrfs, XFS and similar
+FICLONE = 0x40049409
+
+def clone_file(source, target):
+    """Copy source to target as a reflink where the file system supports it, a plain copy otherwise.
+
+    Never a hard link: an output annotated or overwritten in place (say, on a tablet) must not change the
+    cache entry or other exports of the same readings.
+    """
+    if os.path.exists(target):
+        os.remove(target)
+    if sys.platform.startswith('linux'):
+        import fcntl
+        try:
+            with open(source, 'rb') as src, open(target, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+            return
+        except OSError:
+            pass # another file system, or source and target on different ones
+    shutil.copyfile(source, target)
+
+class ExportCache:
+    """Directory of exported PDFs and reading segments, evicted least recently used first (by mtime)."""
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_EXPORT_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.exports_dir = os.path.join(cache_dir, 'exports')
+        self.segments_dir = os.path.join(cache_dir, 'segments')
+        os.makedirs(self.exports_dir, exist_ok=True)
+        os.makedirs(self.segments_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.segment_hits = 0
+        self.segment_misses = 0
+
+    def export_path(self, key):
+        return os.path.join(self.exports_dir, key + '.pdf')
+
+    def segment_path(self, key):
+        return os.path.join(self.segments_dir, key + '.pdf')
+
+    def touch(self, path):
+        # mark as recently used; False if the file is gone
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def get_export(self, key):
+        """Path of the cached export for key, or None.
+
+        An entry whose size or mtime no longer matches what was stored (it was changed outside the cache) is
+        dropped instead of handed out.
+        """
+        path = self.export_path(key)
+        try:
+            stat = os.stat(path)
+            with open(path[:-4] + '.json', 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if [stat.st_mtime_ns, stat.st_size] != stored:
+            self.remove(path)
+            return None
+        self.hits += 1
+        return path
+
+    def put_export(self, key, output_pdf_path):
+        path = self.export_path(key)
+        temp_path = path + '.tmp'
+        clone_file(output_pdf_path, temp_path)
+        os.replace(temp_path, path)
+        stat = os.stat(path)
+        atomic_write_text(path[:-4] + '.json', json.dumps([stat.st_mtime_ns, stat.st_size]))
+
+    def copy_export(self, path, output_pdf_path):
+        clone_file(path, output_pdf_path)
+
+    def get_segment(self, key):
+        path = self.segment_path(key)
+        if self.touch(path):
+            self.segment_hits += 1
+            return path
+        self.segment_misses += 1
+        return None
+
+    def put_segment(self, key, data):
+        atomic_write_bytes(self.segment_path(key), data)
+
+    def remove(self, path):
+        for file_path in (path, path[:-4] + '.json'):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def entries(self):
+        entries = []
+        for directory in (self.exports_dir, self.segments_dir):
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.endswith('.pdf'):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def evict(self, keep=()):
+        # drop least recently used files until the cache fits in max_bytes; paths in keep are left alone
+        if self.max_bytes is None:
+            return
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path in keep:
+                continue
+            self.remove(path)
+            total -= size
@@ -0,0 +1,91 @@
+import re
+
+# Header-only parsing of notes: the YAML front matter (for the tags) and the "Last Practice Date:" line
+# are read line by line, and reading stops as soon as both are known, so indexing a note costs the same
+# however long its practice notes are. Bullets in the body ("- slow practice") are never taken for tags.
+
+FENCE = b'---'
+# some editors start UTF-8 files with a byte order mark
+BOM = b'\xef\xbb\xbf'
+# how far past the front matter the "Last Practice Date:" line is looked for
+DEFAULT_DATE_SEARCH_BYTES = 4096
+
+date_line_pattern = re.compile(rb'Last Practice Date:\s*(\d{4}-\d{2}-\d{2})')
+key_pattern = re.compile(rb'^([A-Za-z_][\w -]*):(.*)$')
+list_item_pattern = re.compile(rb'^\s*-\s+(.*?)\s*$')
+
+def clean_tag(value):
+    value = value.strip().strip(b'"\'').strip()
+    return value.decode('utf-8') if value else None
+
+def inline_tags(value):
+    # "tags: [a, b]" or "tags: a, b"
+    value = value.strip()
+    if value.startswith(b'[') and value.endswith(b']'):
+        value = value[1:-1]
+    return [tag for tag in (clean_tag(part) for part in value.split(b',')) if tag]
+
+def read_header(file, date_search_bytes=DEFAULT_DATE_SEARCH_BYTES):
+    """Parse the header of a note from a binary file object positioned at its start.
+
+    Returns (tags, date_str, body_offset): the tags listed under "tags:" in the front matter, the
+    "Last Practice Date:" (YYYY-MM-DD, or None) found in the front matter or within date_search_bytes
+    after it, and the byte offset of the first non-blank line after the front matter (0 without front
+    matter). Lines past that point are only read while the date is still missing.
+    """
+    tags = []
+    date_str = None
+    offset = 0
+
+    first_line = file.readline()
+    if first_line.removeprefix(BOM).strip() == FENCE:
+        offset = len(first_line) # the BOM included
+        current_key = None
+        while True:
+            line = file.readline()
+            if not line:
+                break # unterminated front matter: everything was header
+            offset += len(line)
+            if line.strip() == FENCE:
+                break
+            match = date_line_pattern.search(line)
+            if match:
+                date_str = match.group(1).decode('ascii')
+            key = key_pattern.match(line)
+            if key and not line[:1].isspace():
+                current_key = key.group(1).strip().lower()
+                if current_key == b'tags' and key.group(2).strip():
+                    tags.extend(inline_tags(key.group(2)))
+                continue
+            item = list_item_pattern.match(line)
+            if item and current_key == b'tags':
+                tag = clean_tag(item.group(1))
+                if tag:
+                    tags.append(tag)
+        pending = []
+    else:
+        # no front matter: the whole note is body, starting with the line already read
+        pending = [first_line] if first_line else []
+
+    body_offset = None
+    position = offset
+    search_end = offset + date_search_bytes
+    while body_offset is None or (date_str is None and position < search_end):
+        line = pending.pop() if pending else file.readline()
+        if not line:
+            break
+        if body_offset is None and line.strip():
+            body_offset = position
+        position += len(line)
+        if date_str is None:
+            match = date_line_pattern.search(line)
+            if match:
+                date_str = match.group(1).decode('ascii')
+    if body_offset is None:
+        body_offset = position # nothing but blank lines after the front matter
+    return tags, date_str, body_offset
+
+def parse_header(file_path, date_search_bytes=DEFAULT_DATE_SEARCH_BYTES):
+    # small buffer: most headers fit in the first read, and little of the body is pulled in with them
+    with open(file_path, 'rb', buffering=4096) as file:
+        return read_header(file, date_search_bytes)
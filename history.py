@@ -0,0 +1,233 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from reading import NO_PRACTICE_DAY
+from catalog import DEFAULT_PRACTICE_DATE
+from instrument import traced, count
+from storage import locked
+
+# Append-only log of practice events, kept next to the notes in <vault>/.practice-tracker/ (hidden folders are
+# skipped by the scanner and the watcher, and the log moves with the vault):
+#
+#   readings.txt  one vault-relative note path per line; the line number is the reading id
+#   events.bin    fixed-size records (reading id, day, kind), appended one export at a time
+#   lock          held by a writer while it reads what other processes appended and adds its own records
+#
+# Days count from 1970-01-01, like Reading.practice_day. A crash can only leave a partial record at the end of
+# events.bin, which is ignored (and overwritten by the next batch). The lock lets the GUI and a CLI job log to
+# the same vault at once on one computer; it does not hold across machines sharing the vault through a network
+# or sync folder.
+# The queries run on numpy arrays built from the log and the catalog frame; they never open the notes.
+
+HISTORY_DIR_NAME = '.practice-tracker'
+EVENTS_FILE_NAME = 'events.bin'
+READINGS_FILE_NAME = 'readings.txt'
+LOCK_FILE_NAME = 'lock'
+
+EVENT_DTYPE = np.dtype([('reading', '<u4'), ('day', '<i4'), ('kind', 'u1')])
+# kind: an export, or a "Last Practice Date" found in a note when the log was started
+EXPORTED = 0
+IMPORTED = 1
+
+def to_day(date_str):
+    return int(np.datetime64(date_str, 'D').astype(np.int64))
+
+def week_start(days):
+    # Monday of the week of every day (1970-01-01 was a Thursday)
+    return days - (days + 3) % 7
+
+class PracticeHistory:
+    """The practice log of one vault; record() appends, the other methods query what is loaded.
+
+    Thread-safe: exports record on the Tk thread or a CLI job while searches query on worker threads.
+    """
+
+    def __init__(self, vault_path):
+        self.vault_path = os.path.abspath(vault_path)
+        self.directory = os.path.join(self.vault_path, HISTORY_DIR_NAME)
+        self.paths = []
+        self.ids = {}
+        self.events = np.zeros(0, dtype=EVENT_DTYPE)
+        self.lock = threading.RLock()
+        self._by_day = None
+        # bytes of readings.txt / events.bin read so far
+        self.readings_size = 0
+        self.events_size = 0
+
+    @classmethod
+    def load(cls, vault_path):
+        history = cls(vault_path)
+        history.read_appended()
+        return history
+
+    def read_appended(self):
+        # pick up what was appended to the log since it was last read, by this or another process
+        readings_path = os.path.join(self.directory, READINGS_FILE_NAME)
+        if os.path.isfile(readings_path):
+            with open(readings_path, 'rb') as f:
+                f.seek(self.readings_size)
+                data = f.read()
+            complete = data.rfind(b'\n') + 1 # a line is only taken once its newline is written
+            for path in data[:complete].decode('utf-8').splitlines():
+                self.ids.setdefault(path, len(self.paths))
+                self.paths.append(path)
+            self.readings_size += complete
+        events_path = os.path.join(self.directory, EVENTS_FILE_NAME)
+        if os.path.isfile(events_path):
+            with open(events_path, 'rb') as f:
+                f.seek(self.events_size)
+                data = f.read()
+            complete = len(data) - len(data) % EVENT_DTYPE.itemsize
+            if complete:
+                events = np.frombuffer(data[:complete], dtype=EVENT_DTYPE).copy()
+                # events of ids missing from readings.txt (its append was lost) cannot be attributed
+                self.events = np.concatenate([self.events, events[events['reading'] < len(self.paths)]])
+                self.events_size += complete
+                self._by_day = None
+
+    def __len__(self):
+        return len(self.events)
+
+    def reading_id(self, file_path):
+        return self.ids.get(os.path.relpath(file_path, self.vault_path), -1)
+
+    def record(self, file_paths, date_str):
+        # one export: every file practiced on date_str (YYYY-MM-DD)
+        self.record_events([(file_path, date_str) for file_path in file_paths])
+
+    @traced('history_record')
+    def record_events(self, pairs, kind=EXPORTED):
+        """Append one event per (file_path, date_str) pair, in a single write."""
+        pairs = list(pairs)
+        if not pairs:
+            return
+        with self.lock:
+            os.makedirs(self.directory, exist_ok=True)
+            # ids are the line numbers of readings.txt, so they are given out under the lock, after reading
+            # what other processes (the GUI and a CLI job, say) appended in the meantime
+            with locked(os.path.join(self.directory, LOCK_FILE_NAME)):
+                self.read_appended()
+                new_paths = []
+                for file_path, _ in pairs:
+                    key = os.path.relpath(file_path, self.vault_path)
+                    if key not in self.ids:
+                        self.ids[key] = len(self.paths) + len(new_paths)
+                        new_paths.append(key)
+                events = np.zeros(len(pairs), dtype=EVENT_DTYPE)
+                events['reading'] = [self.ids[os.path.relpath(file_path, self.vault_path)] for file_path, _ in pairs]
+                events['day'] = [to_day(day) for _, day in pairs]
+                events['kind'] = kind
+                # the ids go to disk before the events that use them
+                if new_paths:
+                    data = ''.join(path + '\n' for path in new_paths).encode('utf-8')
+                    with open(os.path.join(self.directory, READINGS_FILE_NAME), 'ab') as f:
+                        f.write(data)
+                    self.paths.extend(new_paths)
+                    self.readings_size += len(data)
+                events_path = os.path.join(self.directory, EVENTS_FILE_NAME)
+                with open(events_path, 'ab'):
+                    pass
+                with open(events_path, 'r+b') as f:
+                    # after the last complete record, dropping a partial one left by a crash
+                    f.seek(self.events_size)
+                    f.write(events.tobytes())
+                    f.truncate()
+                self.events_size += len(events) * EVENT_DTYPE.itemsize
+                self.events = np.concatenate([self.events, events])
+                self._by_day = None
+        count('history_events', len(events))
+
+    def seed(self, df):
+        # start the log with the dates already in the notes, so it is complete from day one
+        dated = df[df['last_practice_date'] > pd.Timestamp(DEFAULT_PRACTICE_DATE)]
+        self.record_events(zip(dated['path'].astype(str), dated['last_practice_date'].dt.strftime('%Y-%m-%d')), kind=IMPORTED)
+
+    def snapshot(self):
+        # events sorted by day, so date ranges are two binary searches
+        with self.lock:
+            if self._by_day is None:
+                self._by_day = self.events[np.argsort(self.events['day'], kind='stable')]
+            return self._by_day
+
+    def between(self, start=None, end=None):
+        # events with start <= day < end (YYYY-MM-DD strings; None for no bound)
+        events = self.snapshot()
+        days = events['day']
+        low = np.searchsorted(days, to_day(start)) if start else 0
+        high = np.searchsorted(days, to_day(end)) if end else len(days)
+        return events[low:high]
+
+    def row_ids(self, df):
+        # reading id of every catalog row (-1 for notes never recorded), via the path categories
+        paths = df['path']
+        if not isinstance(paths.dtype, pd.CategoricalDtype):
+            paths = paths.astype('category')
+        category_ids = np.array([self.reading_id(path) for path in paths.cat.categories] + [-1], dtype=np.int64)
+        return category_ids[paths.cat.codes.to_numpy()]
+
+    def last_days(self):
+        # latest day per reading id (NO_PRACTICE_DAY for none)
+        with self.lock:
+            events, size = self.events, len(self.paths)
+        last = np.full(size, NO_PRACTICE_DAY, dtype=np.int64)
+        np.maximum.at(last, events['reading'].astype(np.int64), events['day'].astype(np.int64))
+        return last
+
+    def practice_counts(self, df, start=None, end=None):
+        """Number of practices of every row of df between start and end."""
+        counts = np.bincount(self.between(start, end)['reading'], minlength=len(self.paths))
+        counts = np.append(counts, 0) # for rows without an id
+        return counts[self.row_ids(df)]
+
+    @traced('history_tag_counts')
+    def tag_counts(self, df, tags, start=None, end=None):
+        """{tag: practices of readings with that tag between start and end} ("how often did I play etudes last month")."""
+        counts = self.practice_counts(df, start, end)
+        return {tag: int(counts[df[tag].to_numpy(dtype=bool)].sum()) for tag in tags if tag in df.columns}
+
+    def weekly_totals(self, df=None, start=None, end=None):
+        """Practices per week (indexed by the Monday), optionally only of the readings in df."""
+        events = self.between(start, end)
+        if df is not None:
+            ids = self.row_ids(df)
+            events = events[np.isin(events['reading'], ids[ids >= 0])]
+        weeks, totals = np.unique(week_start(events['day'].astype(np.int64)), return_counts=True)
+        return pd.Series(totals, index=pd.to_datetime(weeks.astype('datetime64[D]')), name='practices')
+
+    def longest_neglected(self, df, n=10):
+        """The n rows of df practiced longest ago according to the log (never practiced first)."""
+        last = np.append(self.last_days(), NO_PRACTICE_DAY)[self.row_ids(df)]
+        n = min(n, len(df))
+        if n == 0:
+            return df.iloc[:0]
+        oldest = np.argpartition(last, n - 1)[:n] if n < len(df) else np.arange(len(df))
+        return df.iloc[oldest[np.argsort(last[oldest], kind='stable')]]
+
+    def apply_dates(self, df):
+        """Move every row's last_practice_date forward to the latest logged practice, in place.
+
+        Covers exports whose write-back was skipped (the note was being edited); dates in the notes that are
+        newer than the log are kept.
+        """
+        last = np.append(self.last_days(), NO_PRACTICE_DAY)[self.row_ids(df)]
+        logged = last != NO_PRACTICE_DAY
+        if not logged.any():
+            return
+        dates = df['last_practice_date'].to_numpy().astype('datetime64[s]')
+        logged_dates = last.astype('datetime64[D]').astype('datetime64[s]')
+        newer = logged & (logged_dates > dates)
+        if newer.any():
+            dates = np.where(newer, logged_dates, dates)
+            df['last_practice_date'] = dates
+
+def open_history(vault_path, df):
+    # the vault's log, started from the dates in the notes the first time, or applied to df otherwise
+    history = PracticeHistory.load(vault_path)
+    if len(history):
+        history.apply_dates(df)
+    else:
+        history.seed(df)
+    return history
@@ -0,0 +1,146 @@
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+from render_cache import RenderCache, MARKER_EXTENSION
+from instrument import traced, count
+
+# Resampling of embedded images before they are drawn.
+#
+# Phone photos of scores are several times the resolution a tablet can show, so every PNG attachment is scaled
+# down to "ImageDPI" (default 150) at the width it is drawn at, turned to grayscale or black and white where
+# that loses nothing visible, and stored as JPEG ("ImageQuality", default 80) or, for black and white, PNG
+# (Flate). "ImageColor" ("auto", "color", "gray", "bilevel") and "ImageFormat" ("auto", "jpeg", "png")
+# override the choices; "ImageOptimize": false draws the attachments as they are.
+#
+# Results go to the render cache, keyed by the attachment (path, mtime, size) and the settings, so an image is
+# only processed again after it changes; they have their own counters (image_cache_hits, images_optimized)
+# rather than the render cache's page hits and misses. Images with transparency are left alone (flattening
+# them would change how they look), and so are images whose result is not smaller: the source is drawn, and
+# the cache only gets a marker under the same key holding the image size, so later exports skip them too.
+
+DEFAULT_IMAGE_DPI = 150
+DEFAULT_IMAGE_QUALITY = 80
+# "auto" picks grayscale when at most this share of pixels has channels further apart than GRAY_TOLERANCE
+COLORED_SHARE = 0.01
+GRAY_TOLERANCE = 24
+# and black and white when at least this share of pixels is already (nearly) black or white
+BILEVEL_SHARE = 0.97
+# side of the thumbnail the choices are made on
+SAMPLE_SIZE = 256
+
+def image_settings(config):
+    # the settings from config.json, or None when images are drawn as they are
+    if not config.get('ImageOptimize', True):
+        return None
+    return {
+        'dpi': config.get('ImageDPI', DEFAULT_IMAGE_DPI),
+        'color': config.get('ImageColor', 'auto'),
+        'format': config.get('ImageFormat', 'auto'),
+        'quality': config.get('ImageQuality', DEFAULT_IMAGE_QUALITY),
+    }
+
+def image_key(file_path, draw_width, settings):
+    stat = os.stat(file_path)
+    source = f"{os.path.abspath(file_path)}|{stat.st_mtime_ns}|{stat.st_size}|{draw_width}|{json.dumps(settings, sort_keys=True)}"
+    return hashlib.sha256(('image|' + source).encode('utf-8')).hexdigest()
+
+def choose_mode(image, color):
+    # PIL mode to store image in: 'RGB', 'L' or '1'
+    import numpy as np
+
+    if color != 'auto':
+        return {'color': 'RGB', 'gray': 'L', 'bilevel': '1'}[color]
+    sample = image.convert('RGB')
+    sample.thumbnail((SAMPLE_SIZE, SAMPLE_SIZE))
+    pixels = np.asarray(sample, dtype=np.int16)
+    if ((pixels.max(axis=2) - pixels.min(axis=2)) > GRAY_TOLERANCE).mean() > COLORED_SHARE:
+        return 'RGB'
+    gray = pixels.mean(axis=2)
+    if ((gray < 48) | (gray > 207)).mean() >= BILEVEL_SHARE:
+        return '1'
+    return 'L'
+
+def optimize_image(cache_dir, key, file_path, draw_width, settings):
+    """Resample file_path into the render cache under key; returns (size, path to draw): the cached result, or
+    file_path itself when it is kept as it is (a "keep" marker is cached under key then).
+
+    Runs in a worker process when there are several images to do; eviction is left to the exporting process.
+    """
+    from PIL import Image
+
+    cache = RenderCache(cache_dir, max_bytes=None)
+    with Image.open(file_path) as source:
+        if 'A' in source.getbands() or 'transparency' in source.info:
+            image = None
+        else:
+            source.load()
+            image = source
+        if image is not None:
+            mode = choose_mode(image, settings['color'])
+            target_width = round(draw_width / 72 * settings['dpi'])
+            image = image.convert('L' if mode == '1' else mode)
+            if image.width > target_width:
+                image = image.resize((target_width, max(1, round(image.height * target_width / image.width))), Image.LANCZOS)
+            if mode == '1':
+                image = image.point(lambda value: 255 if value > 127 else 0, mode='1')
+            if mode == '1' or settings['format'] == 'png':
+                path = cache.put(key, image, '.png', optimize=True)
+            else:
+                path = cache.put(key, image, '.jpg', quality=settings['quality'], optimize=True)
+            if os.path.getsize(path) < os.path.getsize(file_path):
+                return image.size, path
+            os.remove(path)
+        cache.put_bytes(key, json.dumps(source.size).encode('utf-8'), MARKER_EXTENSION)
+        return source.size, file_path
+
+@traced('optimize_images')
+def optimize_images(file_paths, render_cache, draw_width, settings, workers=1):
+    """{file_path: (size, path to draw)} for the PNGs in file_paths, drawn draw_width points wide.
+
+    Images not in render_cache are processed on a pool of up to `workers` processes.
+    """
+    from PIL import Image
+
+    optimized = {}
+    missing = []
+    for file_path in dict.fromkeys(file_paths):
+        key = image_key(file_path, draw_width, settings)
+        path = render_cache.find(key, ('.jpg', '.png', MARKER_EXTENSION))
+        if path is None:
+            missing.append((key, file_path))
+            continue
+        if path.endswith(MARKER_EXTENSION):
+            # processed before, and the source was the better choice
+            with open(path, 'r', encoding='utf-8') as f:
+                optimized[file_path] = (tuple(json.load(f)), file_path)
+            continue
+        with Image.open(path) as image:
+            optimized[file_path] = (image.size, path)
+
+    jobs = [(render_cache.cache_dir, key, file_path, draw_width, settings) for key, file_path in missing]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            results = list(executor.map(optimize_image, *zip(*jobs)))
+    else:
+        results = [optimize_image(*job) for job in jobs]
+    written = []
+    kept = 0
+    for (key, file_path), result in zip(missing, results):
+        optimized[file_path] = result
+        if result[1] != file_path:
+            written.append(result[1])
+        else:
+            written.append(render_cache.path(key, MARKER_EXTENSION))
+            kept += 1
+    render_cache.adopt(written, 0, 0, written=len(written))
+    count('image_cache_hits', len(optimized) - len(results))
+    count('images_optimized', len(written) - kept)
+    return optimized
+
+def bytes_saved(optimized):
+    # (bytes of the sources, bytes of what is drawn instead)
+    source_bytes = sum(os.path.getsize(file_path) for file_path in optimized)
+    output_bytes = sum(os.path.getsize(path) for _, path in optimized.values())
+    return source_bytes, output_bytes
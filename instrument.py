@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
+from collections import Counter
+
+# Timing spans and counters for the scan -> catalog -> filter -> export -> write-back pipeline.
+#
+# Tracing is off unless enable_tracing() was called (app.py / cli.py --trace FILE, or "TracePath" in the
+# settings). While it is off, span() returns a shared do-nothing object and count() returns right away,
+# so the calls can stay in the hot paths. When it is on, every finished span and every flush of the
+# counters is appended to the trace file as one JSON object per line:
+#
+#   {"type": "span", "name": "parse", "start": 0.0123, "duration": 0.456, "thread": "MainThread", "parent": "catalog_load", "files": 20}
+#   {"type": "counters", "time": 1.23, "counters": {"files_parsed": 20, "pages_rendered": 6, ...}}
+#
+# start and time are seconds since tracing was enabled.
+
+trace_file = None
+trace_started = 0.0
+trace_lock = threading.Lock()
+counters = Counter()
+active_spans = threading.local()
+
+class NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **fields):
+        pass
+
+NULL_SPAN = NullSpan()
+
+class Span:
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        stack = getattr(active_spans, 'stack', None)
+        if stack is None:
+            stack = active_spans.stack = []
+        self.parent = stack[-1].name if stack else None
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        active_spans.stack.pop()
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        write_span(self.name, self.start, self.parent, self.fields)
+        return False
+
+    def set(self, **fields):
+        # attach results that are only known inside the span (e.g. the number of rows found)
+        self.fields.update(fields)
+
+def tracing():
+    return trace_file is not None
+
+def enable_tracing(path):
+    """Append spans and counters to the JSON-lines file at path until disable_tracing()."""
+    global trace_file, trace_started
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    trace_started = time.perf_counter()
+    trace_file = open(path, 'a', encoding='utf-8')
+    write_record({'type': 'start', 'pid': os.getpid(), 'argv': sys.argv, 'time': time.time()})
+
+def disable_tracing():
+    global trace_file
+    if trace_file is None:
+        return
+    flush_counters()
+    with trace_lock:
+        trace_file.close()
+        trace_file = None
+
+def write_record(record):
+    with trace_lock:
+        if trace_file is not None:
+            trace_file.write(json.dumps(record, default=str) + '\n')
+            trace_file.flush()
+
+def span(name, **fields):
+    """Context manager timing the enclosed block as `name`; extra keyword fields are written with it."""
+    if trace_file is None:
+        return NULL_SPAN
+    return Span(name, fields)
+
+def write_span(name, started, parent, fields):
+    record = {
+        'type': 'span',
+        'name': name,
+        'start': round(started - trace_started, 6),
+        'duration': round(time.perf_counter() - started, 6),
+        'thread': threading.current_thread().name,
+        'parent': parent,
+    }
+    record.update(fields)
+    write_record(record)
+
+def record_span(name, started, **fields):
+    """Write a span for work that began at `started` (a time.perf_counter() value) and ends now."""
+    if trace_file is None:
+        return
+    stack = getattr(active_spans, 'stack', None)
+    write_span(name, started, stack[-1].name if stack else None, fields)
+
+def traced(name):
+    """Decorator: time every call of the function as a span called `name`."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if trace_file is None:
+                return function(*args, **kwargs)
+            with Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def count(name, value=1):
+    if trace_file is None:
+        return
+    with trace_lock:
+        counters[name] += value
+
+def flush_counters():
+    # write the counters collected so far (they keep accumulating)
+    with trace_lock:
+        snapshot = dict(counters)
+    write_record({'type': 'counters', 'time': round(time.perf_counter() - trace_started, 6), 'counters': snapshot})
+
+class StackSampler:
+    """Samples the stack of one thread every `interval` seconds; write() saves them in the "collapsed" format
+    (one "outer;inner;leaf count" line per distinct stack) read by flamegraph.pl and speedscope."""
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='stack-sampler', daemon=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, samples in self.samples.most_common():
+                f.write(f"{stack} {samples}\n")
+
+@contextlib.contextmanager
+def profile(path, mode='cprofile'):
+    """Profile the calling thread while the block runs and save the result to path.
+
+    mode 'cprofile' writes pstats data (python -m pstats, snakeviz); 'sampling' writes collapsed stacks
+    sampled every 5 ms, which costs far less on long exports.
+    """
+    if mode == 'sampling':
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(path)
+            print(f"Stack samples written to {path}")
+    else:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+            print(f"Profile written to {path}")
@@ -0,0 +1,81 @@
+import queue
+import threading
+import traceback
+
+class JobCancelled(Exception):
+    pass
+
+class Job:
+    def __init__(self, runner, name, on_progress=None):
+        self.runner = runner
+        self.name = name
+        self.on_progress = on_progress
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def progress(self, done, total, status=''):
+        # called from the worker thread; raises JobCancelled once cancel() was requested so the work unwinds cleanly
+        if self.cancelled:
+            raise JobCancelled()
+        if self.on_progress is not None:
+            self.runner.call_soon(self.on_progress, done, total, status)
+
+class JobRunner:
+    """Runs work on background threads and hands every callback back to the thread that polls it (the Tk loop).
+
+    Worker threads never touch widgets: on_done / on_error / on_cancel / on_progress are queued and run
+    by process_messages(), which poll() schedules with root.after.
+    """
+
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def call_soon(self, fn, *args):
+        # thread-safe: run fn(*args) on the polling thread
+        self.messages.put((fn, args))
+
+    def start(self, name, work, on_done=None, on_error=None, on_cancel=None, on_progress=None):
+        job = Job(self, name, on_progress)
+
+        def run():
+            try:
+                result = work(job)
+            except JobCancelled:
+                if on_cancel is not None:
+                    self.call_soon(on_cancel)
+            except Exception as e:
+                if on_error is not None:
+                    self.call_soon(on_error, e)
+                else:
+                    print(f"{name} failed: {type(e).__name__}: {e}")
+            else:
+                if on_done is not None:
+                    self.call_soon(on_done, result)
+
+        threading.Thread(target=run, name=name, daemon=True).start()
+        return job
+
+    def process_messages(self, limit=200):
+        # at most `limit` callbacks per call so a flood of progress updates cannot starve the event loop
+        for _ in range(limit):
+            try:
+                fn, args = self.messages.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                fn(*args)
+            except Exception:
+                # reported like Tk reports a failing callback; the other messages still get delivered
+                print(f"Callback {getattr(fn, '__name__', fn)} failed:")
+                traceback.print_exc()
+
+    def poll(self, root, interval_ms=50):
+        # rescheduled first, so nothing that happens while processing can stop the polling
+        root.after(interval_ms, self.poll, root, interval_ms)
+        self.process_messages()
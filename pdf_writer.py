@@ -0,0 +1,166 @@
+import os
+import io
+
+from instrument import traced, count
+
+# Bounded-memory assembly of exports.
+#
+# reportlab keeps everything drawn on a canvas (including every image) in memory until the canvas is saved, so
+# the readings are rendered in chunks whose estimated size fits in "ExportMemoryBytes"; each chunk is saved,
+# cut into one PDF per reading ("segments") and dropped before the next chunk is drawn. The segments are then
+# grouped into volumes of at most "ExportVolumePages" pages / "ExportVolumeBytes" bytes (a reading is never
+# split) and every volume is written with its own outline: one bookmark per reading.
+#
+# pdfium cannot write bookmarks, so a volume starts as a reportlab skeleton of blank pages carrying the outline,
+# and the segment pages are placed onto those pages; the outline keeps pointing at the right pages. Placing a
+# page costs more the larger the volume is, and every placed page brings its own copy of the images and PDF
+# pages it shows, so a volume that fits in one canvas is rendered again straight into its file (see
+# export.write_export) and only volumes too large for that are stitched from segments.
+
+DEFAULT_EXPORT_MEMORY_BYTES = 128 * 1024 * 1024
+# a rasterized PDF page: a 72 dpi letter-sized scan, as the compressed stream the canvas keeps
+RASTER_PAGE_BYTES = 256 * 1024
+
+def estimate_reading_bytes(attachments, vector, can_embed_pdf, seen=None):
+    """Rough size a reading adds to a canvas: its PNGs and imported PDFs at file size, rasterized pages compressed.
+
+    A canvas stores an image once however often it is drawn, so attachments already in seen (a set, updated)
+    are not counted again.
+    """
+    import pypdfium2 as pdfium
+
+    total = 64 * 1024 # text
+    for file_path in attachments.values():
+        if not file_path or (seen is not None and file_path in seen):
+            continue
+        if seen is not None:
+            seen.add(file_path)
+        try:
+            if file_path.endswith('.png') or (file_path.endswith('.pdf') and vector and can_embed_pdf(file_path)):
+                total += os.path.getsize(file_path)
+            elif file_path.endswith('.pdf'):
+                pdf = pdfium.PdfDocument(file_path)
+                total += len(pdf) * RASTER_PAGE_BYTES
+                pdf.close()
+        except (OSError, pdfium.PdfiumError):
+            continue
+    return total
+
+def plan_chunks(estimates, budget):
+    # consecutive groups of readings whose estimates add up to at most budget (at least one reading each)
+    chunks = []
+    current = []
+    size = 0
+    for index, estimate in enumerate(estimates):
+        if current and budget is not None and size + estimate > budget:
+            chunks.append(current)
+            current = []
+            size = 0
+        current.append(index)
+        size += estimate
+    if current:
+        chunks.append(current)
+    return chunks
+
+def plan_volumes(page_counts, sizes, max_pages=None, max_bytes=None):
+    """(start, end) reading ranges of every volume; a volume closes before the reading that would exceed a limit."""
+    volumes = []
+    start = 0
+    pages = 0
+    size = 0
+    for index, (reading_pages, reading_size) in enumerate(zip(page_counts, sizes)):
+        over_pages = max_pages is not None and pages + reading_pages > max_pages
+        over_bytes = max_bytes is not None and size + reading_size > max_bytes
+        if index > start and (over_pages or over_bytes):
+            volumes.append((start, index))
+            start = index
+            pages = 0
+            size = 0
+        pages += reading_pages
+        size += reading_size
+    volumes.append((start, len(page_counts)))
+    return volumes
+
+def volume_paths(output_pdf_path, count):
+    # output.pdf for a single volume, output_vol1.pdf, output_vol2.pdf, ... otherwise
+    if count == 1:
+        return [output_pdf_path]
+    root, extension = os.path.splitext(output_pdf_path)
+    return [f"{root}_vol{number}{extension}" for number in range(1, count + 1)]
+
+def iter_segments(pdf_path, page_counts):
+    """Yield the bytes of a PDF per reading, cut from pdf_path by the page count of every reading."""
+    import pypdfium2 as pdfium
+
+    source = pdfium.PdfDocument(pdf_path)
+    start = 0
+    try:
+        for pages in page_counts:
+            segment = pdfium.PdfDocument.new()
+            segment.import_pages(source, list(range(start, start + pages)))
+            buffer = io.BytesIO()
+            segment.save(buffer)
+            segment.close()
+            start += pages
+            yield buffer.getvalue()
+    finally:
+        source.close()
+
+def page_sizes(pdf_path):
+    import pypdfium2 as pdfium
+
+    pdf = pdfium.PdfDocument(pdf_path)
+    sizes = [pdf.get_page_size(index) for index in range(len(pdf))]
+    pdf.close()
+    return sizes
+
+def outline_skeleton(sizes, bookmarks):
+    # blank pages of the given sizes; bookmarks is a list of (page index, title)
+    from reportlab.pdfgen import canvas
+
+    by_page = {}
+    for number, (page, title) in enumerate(bookmarks):
+        by_page.setdefault(page, []).append((f"reading{number}", title))
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer)
+    for page, size in enumerate(sizes):
+        c.setPageSize(size)
+        for key, title in by_page.get(page, []):
+            c.bookmarkPage(key)
+            c.addOutlineEntry(title, key, level=0)
+        c.showPage()
+    if bookmarks:
+        c.showOutline()
+    c.save()
+    return buffer.getvalue()
+
+@traced('write_volume')
+def write_volume(segments, output_pdf_path):
+    """Write the segments ([(pdf_path, title)]) one after another to output_pdf_path, with a bookmark per title.
+
+    Only one segment is open at a time; its pages are placed as form xobjects on the skeleton's pages.
+    """
+    import pypdfium2 as pdfium
+
+    sizes = []
+    bookmarks = []
+    for pdf_path, title in segments:
+        bookmarks.append((len(sizes), title))
+        sizes.extend(page_sizes(pdf_path))
+    dest = pdfium.PdfDocument(outline_skeleton(sizes, bookmarks))
+    page_index = 0
+    try:
+        for pdf_path, _ in segments:
+            source = pdfium.PdfDocument(pdf_path)
+            for source_index in range(len(source)):
+                page = dest[page_index]
+                page.insert_obj(source.page_as_xobject(source_index, dest).as_pageobject())
+                page.gen_content()
+                page.close()
+                page_index += 1
+            source.close()
+        dest.save(output_pdf_path)
+    finally:
+        dest.close()
+    count('volumes_written')
+    return output_pdf_path
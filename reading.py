@@ -1,48 +1,163 @@
-import re
+import os
+import threading
+from collections import OrderedDict
 from datetime import date, datetime
 
-from util import *
+from frontmatter import parse_header
+from storage import file_signature
 
-def process_md_file(file_path):
-    with open(file_path, 'r') as file:
-        content = file.read()
-    
-    file_name = os.path.basename(file_path)
-    file_name = file_name[:-3] # assumption is that file_path ends with .md
+def decode_body(raw):
+    return raw.decode('utf-8').replace('\r\n', '\n').strip()
+
+def read_body(file_path, body_offset):
+    # load only the body of a reading, starting at the offset recorded when it was parsed
+    with open(file_path, 'rb') as file:
+        file.seek(body_offset)
+        return decode_body(file.read())
+
+# bodies kept around between exports; the catalog itself only stores where each body starts
+DEFAULT_BODY_CACHE_BYTES = 16 * 1024 * 1024
+
+class BodyCache:
+    """Small LRU of decoded reading bodies, bounded by the total size of the cached text.
+
+    Entries are keyed by path, body offset and the file's current [mtime_ns, size], so an edited note is read
+    again. When the note changed since it was scanned (signature is what the catalog saw), its header is parsed
+    again for the body offset, which an edit of the front matter moves.
+    Thread-safe: exports read bodies on a worker thread.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_BODY_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bodies = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, file_path, body_offset, signature=None):
+        current = file_signature(file_path)
+        if signature is not None and list(signature) != current:
+            body_offset = parse_header(file_path)[2]
+        key = (file_path, body_offset, tuple(current))
+        with self.lock:
+            if key in self.bodies:
+                self.bodies.move_to_end(key)
+                return self.bodies[key]
+        body = read_body(file_path, body_offset)
+        with self.lock:
+            if key not in self.bodies and len(body) <= self.max_bytes:
+                self.bodies[key] = body
+                self.size += len(body)
+                while self.size > self.max_bytes:
+                    _, evicted = self.bodies.popitem(last=False)
+                    self.size -= len(evicted)
+        return body
+
+    def clear(self):
+        with self.lock:
+            self.bodies.clear()
+            self.size = 0
+
+body_cache = BodyCache()
+
+class TagVocabulary:
+    """Interns tag names as small integer ids, shared by all readings of the process.
+
+    The tags from Tags/ are added first (see catalog.load_catalog), so their ids follow the order of the
+    tag columns; tags only found in notes get the next free id. Identical tag lists share one tuple of ids.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.ids = {}
+        self.combinations = {}
+        self.lock = threading.Lock()
+
+    def intern(self, tag):
+        # caller holds the lock
+        tag_id = self.ids.get(tag)
+        if tag_id is None:
+            tag_id = self.ids[tag] = len(self.names)
+            self.names.append(tag)
+        return tag_id
 
-    # Extract tags
-    tags = extract_tags(file_path)
+    def extend(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.intern(tag)
 
-    # Extract last practice date
-    date_pattern = re.compile(r'Last Practice Date: (\d{4}-\d{2}-\d{2})')
-    date_match = date_pattern.search(content)
-    last_practice_date = datetime.strptime(date_match.group(1), '%Y-%m-%d') if date_match else None
+    def add(self, tags):
+        # ids of the given tag names, as a shared tuple
+        with self.lock:
+            tag_ids = tuple(self.intern(tag) for tag in tags)
+            return self.combinations.setdefault(tag_ids, tag_ids)
 
-    # Extract body of the .md: it is everything after ---\n.*---\n
-    pattern = re.compile(r'---.*?---\s*(.*)', re.DOTALL)
+    def lookup(self, tag_ids):
+        names = self.names
+        return [names[tag_id] for tag_id in tag_ids]
 
-    # Search for the body in the content
-    match = pattern.search(content)
-    if match:
-        body = match.group(1).strip()
-    else:
-        print(f"No body found in file: {file_path}")
-        body = ""
+tag_vocabulary = TagVocabulary()
 
+# practice dates are stored as days since 1970-01-01 (numpy's datetime64[D] epoch)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+NO_PRACTICE_DAY = -(2 ** 31)
 
-    # file_ref_pattern = re.compile(r'!\[\[.+\]\]')
-    # body = file_ref_pattern.findall(content)
+def to_day(value):
+    return value.toordinal() - EPOCH_ORDINAL if value is not None else NO_PRACTICE_DAY
 
-    return Reading(file_name, tags, last_practice_date, body, file_path)
+def from_day(day):
+    return datetime.fromordinal(day + EPOCH_ORDINAL) if day != NO_PRACTICE_DAY else None
+
+def process_md_file(file_path):
+    # only the front matter and the "Last Practice Date:" line are read (see frontmatter.py); the body is
+    # read again (see BodyCache) when the reading is exported
+    tags, date_str, body_offset = parse_header(file_path)
+
+    file_name = os.path.basename(file_path)
+    file_name = file_name[:-3] # assumption is that file_path ends with .md
+
+    last_practice_date = datetime.strptime(date_str, '%Y-%m-%d') if date_str else None
+
+    return Reading(file_name, tags, last_practice_date, file_path, body_offset)
 
     
 class Reading:
-    def __init__(self, name: str, tags: list[str], last_practice_date: date, body: str, file_path: str):
+    # compact record: no per-instance __dict__, tags as ids into tag_vocabulary and the date as an int day.
+    # tags and last_practice_date convert back to names / datetime for the code that reads them.
+    __slots__ = ('name', 'tag_ids', 'practice_day', 'file_path', 'body_offset', 'signature')
+
+    def __init__(self, name: str, tags: list[str], last_practice_date: date, file_path: str, body_offset: int = 0):
         self.name = name
         self.tags = tags
         self.last_practice_date = last_practice_date
-        self.body = body
         self.file_path = file_path
+        self.body_offset = body_offset
+        self.signature = None # [mtime_ns, size] of the file when it was scanned
+
+    @property
+    def tags(self):
+        return tag_vocabulary.lookup(self.tag_ids)
+
+    @tags.setter
+    def tags(self, tags):
+        self.tag_ids = tag_vocabulary.add(tags)
+
+    @property
+    def last_practice_date(self):
+        return from_day(self.practice_day)
+
+    @last_practice_date.setter
+    def last_practice_date(self, value):
+        self.practice_day = to_day(value)
+
+    def __reduce__(self):
+        # tag ids are only meaningful in this process: readings parsed in worker processes travel as names
+        return (Reading, (self.name, self.tags, self.last_practice_date, self.file_path, self.body_offset), {'signature': self.signature})
+
+    def __setstate__(self, state):
+        self.signature = state['signature']
+
+    def load_body(self):
+        return body_cache.get(self.file_path, self.body_offset, self.signature)
 
     def __repr__(self):
-        return f"Reading(name = {self.name}, tags={self.tags}, last_practice_date={self.last_practice_date}, body={self.body})"
\ No newline at end of file
+        return f"Reading(name = {self.name}, tags={self.tags}, last_practice_date={self.last_practice_date}, file_path={self.file_path})"
\ No newline at end of file
@@ -0,0 +1,126 @@
+import os
+import io
+import hashlib
+
+from storage import atomic_write_bytes
+
+DEFAULT_RENDER_CACHE_BYTES = 512 * 1024 * 1024
+# what the cache stores: rendered pages as PNG, resampled images (see image_pipeline.py) as PNG or JPEG
+FORMATS = {'.png': 'PNG', '.jpg': 'JPEG'}
+# a few bytes standing for "nothing better than the source" (see image_pipeline.py); cached and evicted like the rest
+MARKER_EXTENSION = '.keep'
+
+class RenderCache:
+    """Directory of rendered PDF pages and resampled images, keyed by source file, page and render settings.
+
+    Files are written atomically, so several exports can share the directory. Least recently used pages
+    (by file mtime, which is refreshed on every hit) are evicted once the total size exceeds max_bytes;
+    max_bytes=None disables eviction. Pages handed out since the last release() are never evicted, so an
+    export can hold on to the paths until its canvas has been written.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_RENDER_CACHE_BYTES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._total_bytes = None # computed on first write
+        self._pinned = set()
+
+    def key(self, pdf_path, page_index, scale=1, rotation=0):
+        stat = os.stat(pdf_path)
+        source = f"{os.path.abspath(pdf_path)}|{stat.st_mtime_ns}|{stat.st_size}|{page_index}|{scale}|{rotation}"
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    def path(self, key, extension='.png'):
+        return os.path.join(self.cache_dir, key + extension)
+
+    def get(self, key):
+        # returns the cached file path, or None on a miss
+        path = self.find(key)
+        if path is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return path
+
+    def find(self, key, extensions=('.png',)):
+        # the cached file path (stored with any of extensions), or None; not counted in hits / misses
+        for extension in extensions:
+            path = self.path(key, extension)
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                continue
+            self._pinned.add(path)
+            return path
+        return None
+
+    def put(self, key, pil_image, extension='.png', **save_options):
+        buffer = io.BytesIO()
+        pil_image.save(buffer, format=FORMATS[extension], **save_options)
+        return self.put_bytes(key, buffer.getvalue(), extension)
+
+    def put_bytes(self, key, data, extension='.png'):
+        path = self.path(key, extension)
+        atomic_write_bytes(path, data)
+        self._pinned.add(path)
+        if self.max_bytes is not None:
+            if self._total_bytes is None:
+                self._total_bytes = self.size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+        return path
+
+    def entries(self):
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                extension = os.path.splitext(entry.name)[1]
+                if extension in FORMATS or extension == MARKER_EXTENSION:
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        # drop least recently used pages until the cache fits in max_bytes
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path in self._pinned:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total_bytes = total
+
+    def adopt(self, paths, hits, misses, written=None):
+        # account for pages looked up / rendered into this folder by a worker process; written: how many of
+        # paths are new files, when they are not counted as misses (resampled images)
+        self._pinned.update(paths)
+        self.hits += hits
+        self.misses += misses
+        if misses or written:
+            self._total_bytes = None # re-measured on release
+
+    def release(self):
+        # let the pages used by the finished export be evicted again
+        self._pinned.clear()
+        if self.max_bytes is not None:
+            if self._total_bytes is None:
+                self._total_bytes = self.size()
+            if self._total_bytes > self.max_bytes:
+                self.evict()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+
+class ResultPages:
+    """Display strings for a sorted search result, formatted a page at a time and only when first needed.
+
+    Supports len() and slicing (pages[start:stop]) like the list of strings it stands in for.
+    """
+
+    def __init__(self, sorted_df, selected, page_size=200):
+        self.df = sorted_df
+        self.selected = sorted(selected)
+        self.page_size = page_size
+        self.pages = {}
+
+    def __len__(self):
+        return len(self.df)
+
+    def __getitem__(self, key):
+        start, stop, _ = key.indices(len(self))
+        rows = []
+        for page_number in range(start // self.page_size, (stop - 1) // self.page_size + 1 if stop > start else 0):
+            if page_number not in self.pages:
+                self.pages[page_number] = format_results(self.df, self.selected, page_number * self.page_size, (page_number + 1) * self.page_size)
+            rows.extend(self.pages[page_number])
+        offset = start - (start // self.page_size) * self.page_size
+        return rows[offset:offset + stop - start]
+
+def format_results(df, selected, start, stop):
+    # "Date: ..., Tags: [...], Name: ..." for rows start:stop, built column-wise instead of row by row
+    page = df.iloc[start:stop]
+    dates = page['last_practice_date'].dt.strftime('%Y-%m-%d')
+    tag_parts = pd.Series('', index=page.index)
+    for tag in selected:
+        tag_parts = tag_parts + np.where(page[tag].to_numpy(), f"'{tag}', ", '')
+    tag_lists = '[' + tag_parts.str[:-2] + ']'
+    return ('Date: ' + dates + ', Tags: ' + tag_lists + ', Name: ' + page['name'].astype(str)).tolist()
@@ -0,0 +1,69 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from reading import process_md_file
+from instrument import traced, count
+
+# parsing is dominated by file reads, so threads pay off even on a single core (especially on network mounts)
+DEFAULT_SCAN_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+@traced('scan')
+def scan_md_files(folder_path):
+    """Recursively list the .md files under folder_path as (path, [mtime_ns, size]), sorted by path.
+
+    Uses os.scandir so the stat information comes with the directory listing where the OS provides it.
+    """
+    found = []
+    pending = [folder_path]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith('.'):
+                        continue # hidden folders and in-progress atomic writes
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.name.endswith('.md') and entry.is_file():
+                        stat = entry.stat()
+                        found.append((entry.path, [stat.st_mtime_ns, stat.st_size]))
+        except FileNotFoundError:
+            continue
+    found.sort(key=lambda item: item[0])
+    count('files_scanned', len(found))
+    return found
+
+def parse_md_file(file_path):
+    # returns (reading, None) or (None, error message) so one bad file does not abort the scan
+    try:
+        return process_md_file(file_path), None
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        return None, f"{type(e).__name__}: {e}"
+
+@traced('parse')
+def parse_md_files(file_paths, workers=DEFAULT_SCAN_WORKERS, use_processes=False):
+    """Parse the given files on a thread (or process) pool.
+
+    Returns (readings, errors) where readings follows the order of file_paths (failed files are left out)
+    and errors is a list of (file_path, message).
+    """
+    if workers <= 1 or len(file_paths) <= 1:
+        results = [parse_md_file(file_path) for file_path in file_paths]
+    elif use_processes:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(file_paths) // (workers * 4))
+            results = list(executor.map(parse_md_file, file_paths, chunksize=chunksize))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(parse_md_file, file_paths))
+
+    readings = []
+    errors = []
+    for file_path, (reading, error) in zip(file_paths, results):
+        if error is None:
+            readings.append(reading)
+        else:
+            errors.append((file_path, error))
+    count('files_parsed', len(readings))
+    count('parse_errors', len(errors))
+    return readings, errors
@@ -0,0 +1,38 @@
+import os
+import json
+import shutil
+import warnings
+
+from storage import user_config_dir, atomic_write_text
+
+CONFIG_FILE_NAME = 'config.json'
+
+def config_path():
+    return os.path.join(user_config_dir(), CONFIG_FILE_NAME)
+
+def load_config(path=None):
+    """Read the settings (an empty dict if there are none yet).
+
+    Without a path the per-user config.json is used; on the first run a config.json in the current folder
+    (where older versions kept it) is copied there.
+    """
+    if path is None:
+        path = config_path()
+        legacy_path = os.path.abspath(CONFIG_FILE_NAME)
+        if not os.path.isfile(path) and os.path.isfile(legacy_path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            shutil.copyfile(legacy_path, path)
+            print(f"Settings moved from '{legacy_path}' to '{path}'.")
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        warnings.warn(f"Ignoring unreadable settings file '{path}': {e}")
+        return {}
+
+def save_config(config, path=None):
+    path = path or config_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    atomic_write_text(path, json.dumps(config, indent=4))
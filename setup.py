@@ -29,6 +29,7 @@ setup(
     entry_points={
         "console_scripts": [
             "music-practice-tracker=app:main",
+            "music-practice-cli=cli:main",
         ],
     },
     include_package_data=True,
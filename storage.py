@@ -0,0 +1,85 @@
+import os
+import sys
+import contextlib
+import hashlib
+import shutil
+import tempfile
+
+APP_DIR_NAME = "MusicPracticeTracker"
+
+def user_cache_dir():
+    # per-user, local cache location (kept off the vault so network mounts are not hit)
+    if sys.platform.startswith('win'):
+        base = os.environ.get('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+        return os.path.join(base, APP_DIR_NAME, 'Cache')
+    if sys.platform == 'darwin':
+        return os.path.join(os.path.expanduser('~/Library/Caches'), APP_DIR_NAME)
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(base, APP_DIR_NAME)
+
+def user_config_dir():
+    # per-user settings location (roaming on Windows, so the vault path follows the user)
+    if sys.platform.startswith('win'):
+        base = os.environ.get('APPDATA') or os.path.expanduser('~\\AppData\\Roaming')
+        return os.path.join(base, APP_DIR_NAME)
+    if sys.platform == 'darwin':
+        return os.path.join(os.path.expanduser('~/Library/Application Support'), APP_DIR_NAME)
+    base = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(base, APP_DIR_NAME)
+
+def vault_cache_dir(vault_path):
+    # one cache folder per vault, named after a digest of its absolute path
+    vault_key = hashlib.sha1(os.path.abspath(vault_path).encode('utf-8')).hexdigest()[:16]
+    path = os.path.join(user_cache_dir(), vault_key)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def file_signature(file_path):
+    # [mtime_ns, size]: what the caches use to tell whether a file changed
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def atomic_write_bytes(path, data):
+    # write to a temp file in the same folder, then rename over the target (keeping its permissions)
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        if os.path.exists(path):
+            shutil.copymode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def atomic_write_text(path, text):
+    atomic_write_bytes(path, text.encode('utf-8'))
+
+@contextlib.contextmanager
+def locked(lock_path):
+    # exclusive lock between processes on this computer (held on lock_path, which is created if needed);
+    # blocks until the other holder is done. Not reliable across machines on network or sync folders.
+    with open(lock_path, 'a+b') as f:
+        if sys.platform.startswith('win'):
+            import msvcrt
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass # LK_LOCK gives up after about 10 seconds
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from instrument import traced
+
+# popcount of every byte value, for numpy versions without np.bitwise_count
+POPCOUNT_TABLE = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+def popcount(packed):
+    if hasattr(np, 'bitwise_count'):
+        return int(np.bitwise_count(packed).sum())
+    return int(POPCOUNT_TABLE[packed].sum())
+
+class TagIndex:
+    """Tag membership of every catalog row, stored as packed bitsets (np.packbits, 8 rows per byte).
+
+    Queries are AND-of-ORs: tags of the same type are OR-ed, types are AND-ed (see filter_dataframe).
+    The OR mask of each type is memoized per set of selected tags, so toggling one checkbox only
+    recomputes the mask of that tag's type. The DataFrame is only read when the index is built.
+    """
+
+    def __init__(self, df, tags, cache_size=256):
+        self.n = len(df)
+        self.tag_to_type = {tag: tag_type for tag_type, tag_list in tags.items() for tag in tag_list}
+        self.bits = {tag: np.packbits(df[tag].to_numpy(dtype=bool)) for tag in self.tag_to_type}
+        self.all_bits = np.packbits(np.ones(self.n, dtype=bool))
+        # per tag type, the bitsets of its tags stacked into one (tags x bytes) matrix for the facet counts
+        self.type_tags = {tag_type: list(dict.fromkeys(tag_list)) for tag_type, tag_list in tags.items() if tag_list}
+        self.type_matrix = {tag_type: np.stack([self.bits[tag] for tag in tag_list]) for tag_type, tag_list in self.type_tags.items()}
+        self.cache_size = cache_size
+        self._group_masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def group_selected(self, selected):
+        # tag type -> frozenset of the selected tags of that type
+        grouped_selected = {}
+        for tag in selected:
+            grouped_selected.setdefault(self.tag_to_type[tag], set()).add(tag)
+        return {tag_type: frozenset(tag_set) for tag_type, tag_set in grouped_selected.items()}
+
+    def group_mask(self, tag_type, tag_set):
+        key = (tag_type, tag_set)
+        with self._lock:
+            if key in self._group_masks:
+                self._group_masks.move_to_end(key)
+                return self._group_masks[key]
+        mask = np.bitwise_or.reduce([self.bits[tag] for tag in tag_set]) if tag_set else self.all_bits
+        with self._lock:
+            self._group_masks[key] = mask
+            if len(self._group_masks) > self.cache_size:
+                self._group_masks.popitem(last=False)
+        return mask
+
+    def query(self, selected):
+        # packed mask of the rows matching the selection (all rows when nothing is selected)
+        combined_mask = self.all_bits
+        for tag_type, tag_set in self.group_selected(selected).items():
+            combined_mask = combined_mask & self.group_mask(tag_type, tag_set)
+        return combined_mask
+
+    @traced('facet_counts')
+    def facet_counts(self, selected):
+        """For every tag, the number of rows that would match if that tag's checkbox were toggled."""
+        grouped_selected = self.group_selected(selected)
+        group_masks = {tag_type: self.group_mask(tag_type, tag_set) for tag_type, tag_set in grouped_selected.items()}
+        counts = {}
+        for tag_type, tag_list in self.type_tags.items():
+            # rows allowed by every other tag type
+            others = self.all_bits
+            for other_type, mask in group_masks.items():
+                if other_type != tag_type:
+                    others = others & mask
+            # ticking a tag ORs it into its type's mask (or makes it the only one, if none was ticked)
+            current = group_masks.get(tag_type, np.zeros_like(self.all_bits))
+            ticked = (self.type_matrix[tag_type] | current) & others
+            if hasattr(np, 'bitwise_count'):
+                tick_counts = np.bitwise_count(ticked).sum(axis=1)
+            else:
+                tick_counts = POPCOUNT_TABLE[ticked].sum(axis=1, dtype=np.int64)
+            selected_here = grouped_selected.get(tag_type, frozenset())
+            for tag, tick_count in zip(tag_list, tick_counts):
+                if tag in selected_here:
+                    # unticking it falls back to the other ticked tags of its type (or all rows)
+                    counts[tag] = popcount(self.group_mask(tag_type, selected_here - {tag}) & others)
+                else:
+                    counts[tag] = int(tick_count)
+        return counts
+
+    def mask(self, selected):
+        return self.unpack(self.query(selected))
+
+    def unpack(self, packed):
+        return np.unpackbits(packed, count=self.n).astype(bool)
+
+    def count(self, selected):
+        return popcount(self.query(selected))
+
+@traced('filter')
+def filter_dataframe(df, selected, tag_to_type, tag_index=None):
+    """Rows of df having, for every tag type with a selected tag, at least one of the selected tags of that type.
+
+    Never modifies df. With a TagIndex built over df the masks come from its bitsets.
+    """
+    if tag_index is not None:
+        return df[tag_index.mask(selected)]
+
+    grouped_selected = {}
+    for selected_tag in selected:
+        grouped_selected.setdefault(tag_to_type[selected_tag], []).append(selected_tag)
+
+    combined_mask = np.ones(len(df), dtype=bool)
+    for tag_list in grouped_selected.values():
+        combined_mask &= np.logical_or.reduce([df[tag].to_numpy(dtype=bool) for tag in tag_list])
+    return df[combined_mask]
@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+from export import write_export
+from jobs import JobCancelled
+from pdf_writer import page_sizes
+
+class NoAttachments:
+    def candidates(self, name):
+        return []
+
+def fake_render(indices, pdf_path, progress=None):
+    # one letter page per reading, reporting progress like convert_markdown_to_pdf
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(pdf_path)
+    for done, i in enumerate(indices):
+        if progress is not None:
+            progress(done, len(indices))
+        c.drawString(72, 720, f"reading {i}")
+        c.showPage()
+    if progress is not None:
+        progress(len(indices), len(indices))
+    c.save()
+    return [1] * len(indices)
+
+def export(tmp_path, config, progress=None, n=6):
+    md_strings = [f"Name: piece{i}\n\nbody" for i in range(n)]
+    names = [f"piece{i}" for i in range(n)]
+    return write_export(md_strings, names, str(tmp_path / 'out.pdf'), config, {'embed_mode': 'vector'}, NoAttachments(), fake_render, progress)
+
+def test_volumes_report_one_rising_progress(tmp_path):
+    calls = []
+    outputs = export(tmp_path, {'ExportVolumePages': 4}, lambda done, total, status: calls.append((done, total)))
+    assert [len(page_sizes(path)) for path in outputs] == [4, 2]
+    assert [os.path.basename(path) for path in outputs] == ['out_vol1.pdf', 'out_vol2.pdf']
+    positions = [done for done, _ in calls]
+    assert positions == sorted(positions)
+    assert all(done <= total for done, total in calls)
+    assert calls[-1][0] == calls[-1][1]
+
+def test_cancelling_while_volumes_are_drawn_writes_nothing(tmp_path):
+    seen = []
+
+    def progress(done, total, status):
+        seen.append(done)
+        # past the first pass over all 6 readings: the first volume is being drawn again
+        if len(seen) > 9:
+            raise JobCancelled()
+
+    with pytest.raises(JobCancelled):
+        export(tmp_path, {'ExportVolumePages': 2}, progress)
+    assert os.listdir(tmp_path) == []
+
+def test_single_volume(tmp_path):
+    outputs = export(tmp_path, {})
+    assert outputs == [str(tmp_path / 'out.pdf')]
+    assert len(page_sizes(outputs[0])) == 6
@@ -0,0 +1,58 @@
+import io
+
+from frontmatter import read_header, parse_header
+
+def header(text, **kwargs):
+    return read_header(io.BytesIO(text.encode('utf-8') if isinstance(text, str) else text), **kwargs)
+
+def test_tags_list_date_and_body_offset():
+    text = "---\ntags:\n  - etude\n  - 'bach'\n---\n\n# Title\nLast Practice Date: 2024-01-15\n"
+    tags, date_str, body_offset = header(text)
+    assert tags == ['etude', 'bach']
+    assert date_str == '2024-01-15'
+    assert text.encode('utf-8')[body_offset:].startswith(b'# Title')
+
+def test_bom_before_front_matter():
+    data = b'\xef\xbb\xbf---\ntags:\n  - etude\n---\nBody\n'
+    tags, date_str, body_offset = header(data)
+    assert tags == ['etude']
+    assert date_str is None
+    assert data[body_offset:] == b'Body\n'
+
+def test_crlf_line_endings():
+    data = b'---\r\ntags:\r\n  - etude\r\nLast Practice Date: 2023-05-06\r\n---\r\n\r\nBody\r\n'
+    tags, date_str, body_offset = header(data)
+    assert tags == ['etude']
+    assert date_str == '2023-05-06'
+    assert data[body_offset:] == b'Body\r\n'
+
+def test_inline_tag_list():
+    tags, _, _ = header('---\ntags: [etude, "bach", \'two words\']\ntitle: x\n---\nBody\n')
+    assert tags == ['etude', 'bach', 'two words']
+
+def test_bullets_after_other_keys_and_in_body_are_not_tags():
+    text = "---\ntags:\n  - etude\nauthors:\n  - someone\n---\n- slow practice\n"
+    tags, _, _ = header(text)
+    assert tags == ['etude']
+
+def test_no_front_matter():
+    text = "# Title\n- not a tag\nLast Practice Date: 2022-02-02\n"
+    tags, date_str, body_offset = header(text)
+    assert tags == []
+    assert date_str == '2022-02-02'
+    assert body_offset == 0
+
+def test_date_after_the_search_window_is_not_found():
+    filler = "x" * 100 + "\n"
+    near = "---\ntags:\n  - a\n---\n" + filler * 10 + "Last Practice Date: 2024-03-03\n"
+    far = "---\ntags:\n  - a\n---\n" + filler * 50 + "Last Practice Date: 2024-03-03\n"
+    assert header(near)[1] == '2024-03-03'
+    assert header(far)[1] is None
+    assert header(far, date_search_bytes=len(far))[1] == '2024-03-03'
+
+def test_unterminated_front_matter_and_blank_body(tmp_path):
+    path = tmp_path / 'note.md'
+    path.write_bytes(b'---\ntags:\n  - a\n')
+    assert parse_header(str(path)) == (['a'], None, len(b'---\ntags:\n  - a\n'))
+    path.write_bytes(b'---\ntags:\n  - a\n---\n\n\n')
+    assert parse_header(str(path))[2] == len(b'---\ntags:\n  - a\n---\n\n\n')
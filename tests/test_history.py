@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+
+from history import PracticeHistory, EVENTS_FILE_NAME, EVENT_DTYPE, to_day
+
+def note(vault, name):
+    return os.path.join(str(vault), 'Readings', name)
+
+def frame(vault, names, dates):
+    return pd.DataFrame({
+        'path': pd.Categorical([note(vault, name) for name in names]),
+        'last_practice_date': pd.to_datetime(dates),
+        'etude': [True] * len(names),
+    })
+
+def test_round_trip(tmp_path):
+    history = PracticeHistory.load(tmp_path)
+    history.record([note(tmp_path, 'a.md'), note(tmp_path, 'b.md')], '2024-01-01')
+    history.record([note(tmp_path, 'a.md')], '2024-01-09')
+
+    loaded = PracticeHistory.load(tmp_path)
+    assert loaded.paths == [os.path.join('Readings', 'a.md'), os.path.join('Readings', 'b.md')]
+    assert len(loaded) == 3
+    assert loaded.last_days().tolist() == [to_day('2024-01-09'), to_day('2024-01-01')]
+
+    df = frame(tmp_path, ['a.md', 'b.md', 'c.md'], ['2023-12-01', '2024-02-01', '2023-01-01'])
+    assert loaded.practice_counts(df).tolist() == [2, 1, 0]
+    assert loaded.tag_counts(df, ['etude'], start='2024-01-05') == {'etude': 1}
+    assert loaded.longest_neglected(df, 1)['path'].astype(str).tolist() == [note(tmp_path, 'c.md')]
+    loaded.apply_dates(df)
+    # the log is newer for a.md; the note is newer for b.md
+    assert df['last_practice_date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-09', '2024-02-01', '2023-01-01']
+
+def test_partial_record_is_ignored_and_overwritten(tmp_path):
+    history = PracticeHistory.load(tmp_path)
+    history.record([note(tmp_path, 'a.md')], '2024-01-01')
+    events_path = os.path.join(history.directory, EVENTS_FILE_NAME)
+    with open(events_path, 'ab') as f:
+        f.write(b'\x01\x02') # a crash in the middle of a record
+    reloaded = PracticeHistory.load(tmp_path)
+    assert len(reloaded) == 1
+    reloaded.record([note(tmp_path, 'a.md')], '2024-01-02')
+    assert os.path.getsize(events_path) == 2 * EVENT_DTYPE.itemsize
+    assert len(PracticeHistory.load(tmp_path)) == 2
+
+def test_two_writers_do_not_share_ids(tmp_path):
+    # e.g. the GUI and a CLI job logging to the same vault
+    first = PracticeHistory.load(tmp_path)
+    second = PracticeHistory.load(tmp_path)
+    first.record([note(tmp_path, 'x.md')], '2024-01-01')
+    second.record([note(tmp_path, 'y.md')], '2024-01-02')
+    first.record([note(tmp_path, 'z.md'), note(tmp_path, 'y.md')], '2024-01-03')
+
+    loaded = PracticeHistory.load(tmp_path)
+    assert len(set(loaded.paths)) == len(loaded.paths) == 3
+    df = frame(tmp_path, ['x.md', 'y.md', 'z.md'], ['2000-01-01'] * 3)
+    assert loaded.practice_counts(df).tolist() == [1, 2, 1]
+    loaded.apply_dates(df)
+    assert df['last_practice_date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-01', '2024-01-03', '2024-01-03']
+    # each writer also picked up the other's records
+    assert len(first) == 4
+    assert second.practice_counts(df).tolist() == [1, 1, 0]
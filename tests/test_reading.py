@@ -0,0 +1,36 @@
+import os
+
+from reading import BodyCache, process_md_file
+from storage import file_signature
+
+NOTE = "---\ntags:\n  - etude\n---\n\n# Piece\nLast Practice Date: 2024-01-01\nPlay slowly.\n"
+
+def scanned(tmp_path, text=NOTE):
+    path = tmp_path / 'piece.md'
+    path.write_bytes(text.encode('utf-8'))
+    reading = process_md_file(str(path))
+    reading.signature = file_signature(str(path))
+    return reading
+
+def test_body_is_read_from_the_recorded_offset(tmp_path):
+    reading = scanned(tmp_path)
+    assert BodyCache().get(reading.file_path, reading.body_offset, reading.signature) == "# Piece\nLast Practice Date: 2024-01-01\nPlay slowly."
+
+def test_front_matter_edited_after_the_scan(tmp_path):
+    reading = scanned(tmp_path)
+    cache = BodyCache()
+    # a tag added in the note app moves the body; the catalog still has the old offset and signature
+    edited = NOTE.replace("  - etude\n", "  - etude\n  - étude_über\n")
+    with open(reading.file_path, 'wb') as f:
+        f.write(edited.encode('utf-8'))
+    stat = os.stat(reading.file_path)
+    os.utime(reading.file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.get(reading.file_path, reading.body_offset, reading.signature) == "# Piece\nLast Practice Date: 2024-01-01\nPlay slowly."
+
+def test_body_edited_after_the_scan_is_not_served_from_the_cache(tmp_path):
+    reading = scanned(tmp_path)
+    cache = BodyCache()
+    cache.get(reading.file_path, reading.body_offset, reading.signature)
+    with open(reading.file_path, 'wb') as f:
+        f.write(NOTE.replace('Play slowly.', 'Play faster now.').encode('utf-8'))
+    assert cache.get(reading.file_path, reading.body_offset, reading.signature).endswith('Play faster now.')
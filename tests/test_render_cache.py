@@ -0,0 +1,68 @@
+import os
+
+from render_cache import RenderCache
+
+def touch_source(tmp_path, data=b'%PDF-1.4 source'):
+    path = tmp_path / 'score.pdf'
+    path.write_bytes(data)
+    return str(path)
+
+def age(path, seconds):
+    # move a cache file's mtime back, so the LRU order does not depend on the clock resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10**9))
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    key = cache.key(touch_source(tmp_path), 0)
+    assert cache.get(key) is None
+    path = cache.put_bytes(key, b'page')
+    assert cache.get(key) == path
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+    # find() looks up without counting
+    assert cache.find(key) == path
+    assert cache.stats() == {'hits': 1, 'misses': 1}
+
+def test_key_changes_with_page_scale_rotation_and_source(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    source = touch_source(tmp_path)
+    key = cache.key(source, 0)
+    assert cache.key(source, 0) == key
+    assert len({key, cache.key(source, 1), cache.key(source, 0, scale=2), cache.key(source, 0, rotation=90)}) == 4
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert cache.key(source, 0) != key
+    touch_source(tmp_path, b'%PDF-1.4 a longer source')
+    assert cache.key(source, 0) != key
+
+def test_least_recently_used_are_evicted_past_max_bytes(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=250)
+    paths = [cache.put_bytes(f"key{i}", b'x' * 100) for i in range(2)]
+    cache.release()
+    age(paths[0], 20)
+    age(paths[1], 30)
+    # key0 was used more recently than key1
+    assert cache.find('key0') == paths[0]
+    cache.release()
+    cache.put_bytes('key2', b'x' * 100)
+    assert os.path.exists(paths[0])
+    assert not os.path.exists(paths[1])
+    assert cache.size() <= 250
+
+def test_pinned_files_survive_until_release(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=150)
+    first = cache.put_bytes('key0', b'x' * 100)
+    second = cache.put_bytes('key1', b'x' * 100)
+    # both are in use by the running export, so neither is evicted although the cache is over its size
+    assert os.path.exists(first) and os.path.exists(second)
+    age(first, 10)
+    cache.release()
+    assert not os.path.exists(first)
+    assert os.path.exists(second)
+    assert cache.size() <= 150
+
+def test_no_eviction_without_max_bytes(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_bytes=None)
+    paths = [cache.put_bytes(f"key{i}", b'x' * 1000) for i in range(5)]
+    cache.release()
+    assert all(os.path.exists(path) for path in paths)
@@ -0,0 +1,44 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from scheduler import score_readings, schedule_readings, reading_minutes
+
+TODAY = datetime(2024, 6, 30)
+
+def frame(days_ago, etude=None, sonata=None):
+    n = len(days_ago)
+    return pd.DataFrame({
+        'name': [f"piece{i}" for i in range(n)],
+        'last_practice_date': pd.to_datetime([TODAY - pd.Timedelta(days=days) for days in days_ago]),
+        'etude': etude if etude is not None else [False] * n,
+        'sonata': sonata if sonata is not None else [False] * n,
+    })
+
+def test_scores_follow_days_and_tag_weights():
+    df = frame([10, 20, 0], etude=[True, False, False])
+    scores = score_readings(df, {'ScheduleTagWeights': {'etude': 3}}, TODAY)
+    assert scores[0] == 3.0
+    assert scores[1] == 2.0
+    assert scores[2] == -np.inf # practiced today: below ScheduleMinDays
+
+def test_takes_best_scores_until_the_budget_is_full():
+    df = frame([5, 40, 20, 30])
+    scheduled = schedule_readings(df, {}, 30, TODAY)
+    assert scheduled['name'].tolist() == ['piece1', 'piece3', 'piece2']
+
+def test_stops_at_the_first_piece_that_does_not_fit():
+    df = frame([40, 30, 20], sonata=[False, True, False])
+    config = {'ScheduleTagMinutes': {'sonata': 25}}
+    assert reading_minutes(df, config).tolist() == [10, 25, 10]
+    assert schedule_readings(df, config, 30, TODAY)['name'].tolist() == ['piece0']
+
+def test_ties_keep_the_search_order():
+    df = frame([10, 10, 10]).iloc[[2, 0, 1]]
+    assert schedule_readings(df, {}, 20, TODAY)['name'].tolist() == ['piece2', 'piece0']
+
+def test_empty_when_nothing_is_due_or_no_budget():
+    df = frame([0, 0])
+    assert schedule_readings(df, {}, 60, TODAY).empty
+    assert schedule_readings(frame([10]), {}, 0, TODAY).empty
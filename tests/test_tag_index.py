@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from tag_index import TagIndex, filter_dataframe
+
+TAGS = {'difficulty': ['easy', 'hard'], 'genre': ['etude', 'sonata', 'waltz']}
+ROWS = [
+    ('easy', 'etude'),
+    ('easy', 'sonata'),
+    ('hard', 'etude'),
+    ('hard', 'waltz'),
+    ('easy', 'waltz'),
+]
+
+@pytest.fixture
+def df():
+    columns = {tag: [tag in row for row in ROWS] for tag_list in TAGS.values() for tag in tag_list}
+    return pd.DataFrame(columns)
+
+def brute_force_count(df, selected):
+    return len(filter_dataframe(df, selected, {tag: tag_type for tag_type, tags in TAGS.items() for tag in tags}))
+
+@pytest.mark.parametrize('selected', [set(), {'easy'}, {'easy', 'etude'}, {'easy', 'hard'}, {'etude', 'waltz'}, {'hard', 'etude', 'sonata'}])
+def test_facet_counts_match_toggling_each_tag(df, selected):
+    index = TagIndex(df, TAGS)
+    counts = index.facet_counts(selected)
+    assert set(counts) == {tag for tags in TAGS.values() for tag in tags}
+    for tag, count in counts.items():
+        assert count == brute_force_count(df, selected ^ {tag}), tag
+
+def test_facet_counts_without_selection_are_tag_totals(df):
+    counts = TagIndex(df, TAGS).facet_counts(set())
+    assert counts == {'easy': 3, 'hard': 2, 'etude': 2, 'sonata': 1, 'waltz': 2}
+
+def test_count_and_mask_agree_with_filter(df):
+    index = TagIndex(df, TAGS)
+    selected = {'easy', 'etude', 'waltz'}
+    assert index.count(selected) == 2
+    assert list(index.mask(selected)) == [True, False, False, False, True]
+    assert filter_dataframe(df, selected, index.tag_to_type, index).index.tolist() == [0, 4]
+
+def test_facet_counts_past_a_byte_boundary():
+    # 11 rows: the packed bitsets have a partial last byte, whose padding must not be counted
+    df = pd.DataFrame({'a': [True] * 11, 'b': [i % 2 == 0 for i in range(11)]})
+    index = TagIndex(df, {'type': ['a', 'b']})
+    assert index.facet_counts(set()) == {'a': 11, 'b': 6}
+    assert index.facet_counts({'b'}) == {'a': 11, 'b': 11}
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+
+from storage import file_signature
+from reading import read_body
+from writeback import write_back_date, write_back_dates, apply_write_back
+
+def write_note(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_bytes(text.encode('utf-8'))
+    return str(path)
+
+def frame(paths, body_offsets):
+    signatures = [file_signature(path) for path in paths]
+    return pd.DataFrame({
+        'path': pd.Categorical(paths),
+        'body_offset': body_offsets,
+        'mtime_ns': [signature[0] for signature in signatures],
+        'size': [signature[1] for signature in signatures],
+    })
+
+def test_same_length_date_is_patched_in_place(tmp_path):
+    path = write_note(tmp_path, 'a.md', "---\ntags:\n  - a\n---\n\nLast Practice Date: 2024-01-01\nBody\n")
+    inode = os.stat(path).st_ino
+    status, signature, body_offset = write_back_date(path, file_signature(path), '2024-06-30')
+    assert status == 'updated'
+    assert body_offset is None
+    assert os.stat(path).st_ino == inode
+    assert signature == file_signature(path)
+    assert open(path, encoding='utf-8').read().endswith("Last Practice Date: 2024-06-30\nBody\n")
+
+def test_longer_date_line_is_replaced_and_moves_the_body(tmp_path):
+    text = "---\ntags:\n  - a\nLast Practice Date: none\n---\n\nBody\n"
+    path = write_note(tmp_path, 'a.md', text)
+    old_offset = text.index('Body')
+    df = frame([path], [old_offset])
+    results = write_back_dates([(path, file_signature(path))], '2024-06-30')
+    assert results[path][0] == 'updated'
+    assert open(path, encoding='utf-8').read() == text.replace('none', '2024-06-30')
+
+    apply_write_back(df, results)
+    assert df.loc[0, 'body_offset'] == old_offset + len('2024-06-30') - len('none')
+    assert [df.loc[0, 'mtime_ns'], df.loc[0, 'size']] == file_signature(path)
+    assert read_body(path, df.loc[0, 'body_offset']) == 'Body'
+
+def test_edited_missing_and_dateless_notes_are_left_alone(tmp_path):
+    edited = write_note(tmp_path, 'edited.md', "Last Practice Date: 2024-01-01\n")
+    signature = file_signature(edited)
+    write_note(tmp_path, 'edited.md', "Last Practice Date: 2024-01-01\nmore\n")
+    assert write_back_date(edited, signature, '2024-06-30')[0] == 'modified'
+    assert open(edited, encoding='utf-8').read() == "Last Practice Date: 2024-01-01\nmore\n"
+
+    assert write_back_date(str(tmp_path / 'gone.md'), [0, 0], '2024-06-30')[0] == 'missing'
+    plain = write_note(tmp_path, 'plain.md', "Body\n")
+    assert write_back_date(plain, file_signature(plain), '2024-06-30')[0] == 'unchanged'
+
+def test_results_for_notes_no_longer_in_the_frame(tmp_path):
+    path = write_note(tmp_path, 'a.md', "Last Practice Date: 2024-01-01\n")
+    df = frame([path], [0])
+    before = df.copy()
+    apply_write_back(df, {'/gone': ('updated', [1, 2], 7)})
+    pd.testing.assert_frame_equal(df, before)
@@ -1,17 +1,22 @@
-import os, re
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-from PIL import Image
+import os
 
-import pypdfium2 as pdfium
+# reportlab, PIL and pypdfium2 take a while to import, so they are imported by the functions that need them
+# (on the first export) rather than here; importing util for the tag helpers stays cheap
 
 import io
+import time
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from render_cache import RenderCache
+from image_pipeline import optimize_images, bytes_saved
+from instrument import span, traced, count, record_span
+from frontmatter import parse_header
 
 def extract_tags(file_path):
-    file_name = os.path.basename(file_path)
-    with open(file_path, 'r') as f:
-        raw_content = f.read()
-        return re.findall(r'(?<=- ).+', raw_content)
+    # the tags listed in the front matter of a file in the Tags folder
+    return parse_header(file_path)[0]
 
 def find_file_in_directory(file_name, directory):
     print("starting find_file_in_directory")
@@ -33,8 +38,6 @@ def find_files_in_directory(file_names, directory):
             if file_name in files:
                 found_files[file_name] = os.path.join(root, file_name)
     print("finished finding files in directory")
-    for key, value in found_files.items():
-        print(f"key: {key}, value: {value}")
     # check what files are not found
     for file_name in file_names:
         if file_name not in found_files:
@@ -42,25 +45,98 @@ def find_files_in_directory(file_names, directory):
 
     return found_files
 
-def pdf_to_images(pdf_path, images):
-    # Open the PDF file
+def link_target(line):
+    # the file name of an ![[...]] embed on this line, or None
+    line = line.strip()
+    if '![[' in line and ']]' in line:
+        # Extract filename and find file path from where ![[ends and ]] starts
+        file_name_start_index = line.index('![[') + 3
+        file_name_end_index = line.index(']]')
+        return line[file_name_start_index:file_name_end_index]
+    return None
+
+def attachment_links(md_string):
+    # file names of every embed of a reading, in order
+    return [filename for filename in map(link_target, md_string.split('\n')) if filename is not None]
+
+def pdf_to_images(pdf_path, images, cache, scale=1, rotation=0):
+    # appends (size, png_path) for every page of the PDF; pages already in the render cache are not rendered again
+    import pypdfium2 as pdfium
+    from PIL import Image
+
     pdf = pdfium.PdfDocument(pdf_path)
     n_pages = len(pdf)
     for page_number in range(n_pages):
-        page = pdf.get_page(page_number)
-        image = page.render(
-            scale=1,
-            rotation=0,
-            crop=(0, 0, 0, 0)
-        )
-        PIL_image = image.to_pil()
-        # save it to a temporary file
-        PIL_image.save(f"temp{page_number}.png")
-
-        images.append((PIL_image, f"temp{page_number}.png"))
-
-def addimage(c, img, y_position, file_path, width=500, height=500):
-    img_width, img_height = img.size
+        key = cache.key(pdf_path, page_number, scale, rotation)
+        png_path = cache.get(key)
+        if png_path:
+            with Image.open(png_path) as cached_image:
+                size = cached_image.size
+        else:
+            page = pdf.get_page(page_number)
+            image = page.render(
+                scale=scale,
+                rotation=rotation,
+                crop=(0, 0, 0, 0)
+            )
+            PIL_image = image.to_pil()
+            size = PIL_image.size
+            png_path = cache.put(key, PIL_image)
+
+        images.append((size, png_path))
+    pdf.close()
+
+def render_pdf_job(cache_dir, pdf_path, scale=1, rotation=0):
+    # runs in a worker process; eviction is left to the RenderCache of the exporting process
+    cache = RenderCache(cache_dir, max_bytes=None)
+    images = []
+    pdf_to_images(pdf_path, images, cache, scale, rotation)
+    return images, cache.hits, cache.misses
+
+def iter_rendered_pdfs(pdf_paths, render_cache, workers=1, max_pending=None):
+    """Yield the rendered pages ([(size, png_path)]) of each PDF in pdf_paths, in order.
+
+    With workers > 1 the pages are rendered on a process pool that runs at most max_pending files
+    (default 2 * workers) ahead of the consumer, so only file paths are ever held in memory.
+    """
+    if workers <= 1 or len(pdf_paths) <= 1:
+        for pdf_path in pdf_paths:
+            images = []
+            pdf_to_images(pdf_path, images, render_cache)
+            yield images
+        return
+
+    max_pending = max_pending or 2 * workers
+    executor = ProcessPoolExecutor(max_workers=min(workers, len(pdf_paths)))
+    try:
+        in_flight = {} # pdf_path -> future, so a score embedded by several readings is rendered once
+        pending = deque()
+        remaining = iter(pdf_paths)
+
+        def submit_next():
+            pdf_path = next(remaining, None)
+            if pdf_path is None:
+                return
+            if pdf_path not in in_flight:
+                in_flight[pdf_path] = executor.submit(render_pdf_job, render_cache.cache_dir, pdf_path)
+            pending.append(in_flight[pdf_path])
+
+        for _ in range(max_pending):
+            submit_next()
+        adopted = set()
+        while pending:
+            future = pending.popleft()
+            images, hits, misses = future.result()
+            submit_next()
+            if future not in adopted:
+                adopted.add(future)
+                render_cache.adopt([png_path for _, png_path in images], hits, misses)
+            yield images
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def addimage(c, img_size, y_position, file_path, width=500, height=500):
+    img_width, img_height = img_size
     aspect_ratio = img_height / float(img_width)
     new_width = width - 80  # Assuming 40px margin on each side
     new_height = aspect_ratio * new_width
@@ -73,63 +149,216 @@ def addimage(c, img, y_position, file_path, width=500, height=500):
     
     return y_position
 
-def convert_markdown_to_pdf(md_strings, vault_path, output_pdf_path):
-    c = canvas.Canvas(output_pdf_path, pagesize=letter)
+def can_embed_pdf(pdf_path):
+    # whether the pages of pdf_path can be imported as vector content (otherwise they get rasterized)
+    import pypdfium2 as pdfium
+
+    if not hasattr(pdfium.PdfDocument, 'page_as_xobject'):
+        return False
+    try:
+        pdfium.PdfDocument(pdf_path).close()
+        return True
+    except pdfium.PdfiumError as e:
+        print(f"Falling back to rasterizing {pdf_path}: {e}")
+        return False
+
+def place_pdf_page(dest, src, page_index, dest_index, width, height, margin=40, scale=None, xobjects=None):
+    # draw page `page_index` of src as a form xobject on a new page of dest; fits inside the margins unless scale is given.
+    # xobjects (a dict) lets repeated placements of the same source page share one copy of its content
+    import pypdfium2 as pdfium
+
+    src_width, src_height = src.get_page_size(page_index)
+    if scale is None:
+        scale = min((width - 2 * margin) / src_width, (height - 2 * margin) / src_height)
+    x_offset = (width - src_width * scale) / 2
+    y_offset = (height - src_height * scale) / 2
+
+    page = dest.new_page(width, height, index=dest_index)
+    if xobjects is None:
+        xobjects = {}
+    key = (id(src), page_index)
+    if key not in xobjects:
+        xobjects[key] = src.page_as_xobject(page_index, dest)
+    page_object = xobjects[key].as_pageobject()
+    page_object.transform(pdfium.PdfMatrix().scale(scale, scale).translate(x_offset, y_offset))
+    page.insert_obj(page_object)
+    page.gen_content()
+
+@traced('embed_vector')
+def embed_pdf_pages(base_pdf, inserts, output_pdf_path, width, height, margin=40, scale=None):
+    """Splice the pages of embedded PDFs into base_pdf (bytes written by reportlab) and save to output_pdf_path.
+
+    inserts is a list of (page_count, pdf_path): the pages of pdf_path go after the first page_count pages of base_pdf.
+    Returns the number of pages added by each insert.
+    """
+    import pypdfium2 as pdfium
+
+    dest = pdfium.PdfDocument(base_pdf)
+    sources = {}
+    xobjects = {}
+    added = []
+    # insert from the back so the page counts recorded for earlier inserts stay valid
+    for page_count, pdf_path in reversed(inserts):
+        if pdf_path not in sources:
+            sources[pdf_path] = pdfium.PdfDocument(pdf_path)
+        src = sources[pdf_path]
+        for page_index in range(len(src)):
+            place_pdf_page(dest, src, page_index, page_count + page_index, width, height, margin, scale, xobjects)
+        count('pages_embedded', len(src))
+        added.append(len(src))
+    dest.save(output_pdf_path)
+    return added[::-1]
+
+def convert_markdown_to_pdf(md_strings, vault_path, output_pdf_path, embed_mode='vector', pdf_margin=40, pdf_scale=None, render_cache=None, render_workers=1, attachment_index=None, progress=None, titles=None, image_settings=None, image_stats=None):
+    """Render the readings to output_pdf_path.
+
+    With embed_mode 'vector' the pages of embedded PDFs are imported as vector content (one output page each,
+    fitted inside pdf_margin or scaled by pdf_scale); 'raster' draws them as 72 dpi bitmaps, which is also the
+    fallback for PDFs that cannot be imported. Rasterized pages are taken from / stored in render_cache
+    (a RenderCache); without one they go to a temporary folder that is removed afterwards. render_workers > 1
+    renders them ahead of the canvas on a process pool; the output is the same as with a single worker.
+    Links are resolved through attachment_index (an AttachmentIndex) when given, otherwise by walking the vault.
+    progress(done, total) is called before each reading and before saving; an exception raised from it
+    aborts the export without writing output_pdf_path. With titles (one per reading) the PDF gets an outline
+    with a bookmark on the first page of every reading. With image_settings (see image_pipeline.py) PNG
+    attachments are resampled before they are drawn, and the bytes of their sources and of what was drawn are
+    added to image_stats['source_bytes'] / ['output_bytes'] when given. Returns the number of output pages of
+    every reading.
+    """
+    if render_cache is None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            return convert_markdown_to_pdf(md_strings, vault_path, output_pdf_path, embed_mode, pdf_margin, pdf_scale, RenderCache(temp_dir, max_bytes=None), render_workers, attachment_index, progress, titles, image_settings, image_stats)
+
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import letter
+    from PIL import Image
+
     width, height = letter
+    vector = embed_mode == 'vector'
+    if vector:
+        base_pdf = io.BytesIO()
+        c = canvas.Canvas(base_pdf, pagesize=letter)
+    else:
+        c = canvas.Canvas(output_pdf_path, pagesize=letter)
+    inserts = []
+    # the reading every insert belongs to, and the canvas page each reading starts on
+    insert_readings = []
+    reading_starts = []
 
     # fetch the path of all links that are needed:
     files_to_find = []
     for md_string in md_strings:
-        for line in md_string.split('\n'):
-            line = line.strip()
-            if '![[' in line and ']]' in line:
-                # Extract filename and find file path from where ![[ends and ]] starts
-                file_name_start_index = line.index('![[') + 3
-                file_name_end_index = line.index(']]')
-                filename = line[file_name_start_index:file_name_end_index]
-                files_to_find.append(filename)
+        files_to_find.extend(attachment_links(md_string))
     
-    found_files = find_files_in_directory(files_to_find, vault_path)
+    with span('resolve_attachments', links=len(files_to_find)):
+        if attachment_index is not None:
+            found_files = attachment_index.lookup(files_to_find)
+        else:
+            found_files = find_files_in_directory(files_to_find, vault_path)
 
-    for md_string in md_strings:
-        y_position = height - 30  # Starting y position for writing text
+    embeddable = {}
+    def embed_as_vector(file_path):
+        if file_path not in embeddable:
+            embeddable[file_path] = vector and can_embed_pdf(file_path)
+        return embeddable[file_path]
 
-        for line in md_string.split('\n'):
-            line = line.strip()
-            print("line: ", line)
+    # every PDF that will be rasterized, in the order the drawing loop below reaches them
+    rasterized_pdfs = [found_files[filename] for filename in files_to_find
+                       if filename in found_files and found_files[filename].endswith('.pdf') and not embed_as_vector(found_files[filename])]
+    rendered_pdfs = iter_rendered_pdfs(rasterized_pdfs, render_cache, render_workers)
+    hits, misses = render_cache.hits, render_cache.misses
+    draw_started = time.perf_counter()
 
-            if '![[' in line and ']]' in line:
-                # Extract filename and find file path from where ![[ends and ]] starts
-                file_name_start_index = line.index('![[') + 3
-                file_name_end_index = line.index(']]')
-                filename = line[file_name_start_index:file_name_end_index]
+    try:
+        optimized = {}
+        if image_settings is not None:
+            png_paths = [found_files[filename] for filename in files_to_find if filename in found_files and found_files[filename].endswith('.png')]
+            optimized = optimize_images(png_paths, render_cache, width - 80, image_settings, render_workers)
+            if image_stats is not None:
+                source_bytes, output_bytes = bytes_saved(optimized)
+                image_stats['source_bytes'] = image_stats.get('source_bytes', 0) + source_bytes
+                image_stats['output_bytes'] = image_stats.get('output_bytes', 0) + output_bytes
 
-                print("filename: ", filename)
-                if filename in found_files.keys():
-                    file_path = found_files[filename]
-                else:
-                    c.drawString(40, y_position, "Could not find file: " + filename)
-                    y_position -= 20
+        for done, md_string in enumerate(md_strings):
+            if progress is not None:
+                progress(done, len(md_strings))
+            y_position = height - 30  # Starting y position for writing text
+            reading_starts.append(c.getPageNumber() - 1)
+            if titles is not None:
+                c.bookmarkPage(f"reading{done}")
+                c.addOutlineEntry(titles[done], f"reading{done}", level=0)
 
-                if file_path and file_path.endswith('.png'):
-                    with Image.open(file_path) as img:
-                        y_position = addimage(c, img, y_position, file_path, width, height)
+            for line in md_string.split('\n'):
+                line = line.strip()
+                filename = link_target(line)
 
-                elif file_path and file_path.endswith('.pdf'):
-                    images = []
-                    pdf_to_images(file_path, images)
-                    for img, pth in images:
-                        y_position = addimage(c, img, y_position, pth, width, height)
+                if filename is not None:
+                    if filename in found_files.keys():
+                        file_path = found_files[filename]
+                    else:
+                        file_path = None
+                        c.drawString(40, y_position, "Could not find file: " + filename)
+                        y_position -= 20
 
-            else:
-                c.drawString(40, y_position, line)
-                y_position -= 20
+                    if file_path and file_path in optimized:
+                        img_size, pth = optimized[file_path]
+                        y_position = addimage(c, img_size, y_position, pth, width, height)
 
-            if y_position < 40:  # New page if not enough space
+                    elif file_path and file_path.endswith('.png'):
+                        with Image.open(file_path) as img:
+                            y_position = addimage(c, img.size, y_position, file_path, width, height)
+
+                    elif file_path and file_path.endswith('.pdf') and embed_as_vector(file_path):
+                        # finish the current page; the imported pages are spliced in after it once the canvas is saved
+                        if y_position < height - 30:
+                            c.showPage()
+                            y_position = height - 30
+                        inserts.append((c.getPageNumber() - 1, file_path))
+                        insert_readings.append(done)
+                        continue
+
+                    elif file_path and file_path.endswith('.pdf'):
+                        with span('render_wait'):
+                            images = next(rendered_pdfs)
+                        for img_size, pth in images:
+                            y_position = addimage(c, img_size, y_position, pth, width, height)
+
+                else:
+                    c.drawString(40, y_position, line)
+                    y_position -= 20
+
+                if y_position < 40:  # New page if not enough space
+                    c.showPage()
+                    y_position = height - 30
+
+            # a reading that ends with an imported PDF has nothing left on its current page
+            if not (inserts and y_position == height - 30 and inserts[-1][0] == c.getPageNumber() - 1):
                 c.showPage()
-                y_position = height - 30
-            
-        c.showPage()
 
-    c.save()
-    print("PDF created successfully!")
\ No newline at end of file
+        if progress is not None:
+            progress(len(md_strings), len(md_strings))
+        record_span('draw', draw_started, readings=len(md_strings))
+        canvas_pages = c.getPageNumber() - 1
+        if titles:
+            c.showOutline()
+        with span('save'):
+            c.save()
+    finally:
+        rendered_pdfs.close()
+        count('pages_rendered', render_cache.misses - misses)
+        count('render_cache_hits', render_cache.hits - hits)
+        render_cache.release()
+    added = []
+    if vector:
+        if inserts:
+            added = embed_pdf_pages(base_pdf.getvalue(), inserts, output_pdf_path, width, height, pdf_margin, pdf_scale)
+        else:
+            with open(output_pdf_path, 'wb') as f:
+                f.write(base_pdf.getvalue())
+    count('pdf_bytes_written', os.path.getsize(output_pdf_path))
+    print("PDF created successfully!")
+
+    page_counts = [end - start for start, end in zip(reading_starts, reading_starts[1:] + [canvas_pages])]
+    for reading, pages in zip(insert_readings, added):
+        page_counts[reading] += pages
+    return page_counts
\ No newline at end of file
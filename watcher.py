@@ -0,0 +1,349 @@
+import os
+import re
+import sys
+import time
+import errno
+import select
+import struct
+import threading
+import warnings
+import ctypes
+import ctypes.util
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+EVENT_HEADER = struct.Struct('iIII') # wd, mask, cookie, len (the name follows, NUL padded)
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_FULL_SCAN_INTERVAL = 30.0
+DEFAULT_QUIET_PERIOD = 0.5
+DEFAULT_MAX_DELAY = 5.0
+
+def is_hidden(vault_path, path):
+    # anything inside a folder starting with '.' (.obsidian, .git, .trash) or an in-progress atomic write
+    relative = os.path.relpath(path, vault_path)
+    return any(part.startswith('.') for part in relative.split(os.sep))
+
+def walk_directories(root):
+    # root and every non-hidden folder below it
+    found = []
+    pending = [root]
+    while pending:
+        directory = pending.pop()
+        found.append(directory)
+        try:
+            with os.scandir(directory) as entries:
+                pending.extend(entry.path for entry in entries if not entry.name.startswith('.') and entry.is_dir(follow_symlinks=False))
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return found
+
+def scan_directory(directory):
+    # ({path: (mtime_ns, size)} of the non-hidden files directly in directory, [its non-hidden sub folders])
+    files = {}
+    folders = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat(follow_symlinks=False)
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        pass
+    return files, folders
+
+def snapshot(root):
+    # path -> (mtime_ns, size) of every non-hidden file under root
+    files = {}
+    for directory in walk_directories(root):
+        files.update(scan_directory(directory)[0])
+    return files
+
+def directory_mtime(directory):
+    try:
+        return os.stat(directory).st_mtime_ns
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return None
+
+# file systems whose changes made elsewhere (another machine, a sync client) never reach inotify
+REMOTE_FILE_SYSTEMS = {'nfs', 'nfs4', 'cifs', 'smb3', 'smbfs', 'ncpfs', 'afs', 'ceph', 'glusterfs', '9p', 'virtiofs', 'davfs', 'lustre', 'gpfs'}
+
+def mount_type(path):
+    """File system type of the mount holding path, from /proc/self/mounts (Linux; None if unknown)."""
+    path = os.path.realpath(path)
+    best, best_type = '', None
+    try:
+        with open('/proc/self/mounts', 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # spaces and other special characters in mount points are octal escapes
+                mount_point = re.sub(r'\\([0-7]{3})', lambda match: chr(int(match.group(1), 8)), fields[1])
+                inside = path == mount_point or path.startswith(mount_point.rstrip('/') + '/')
+                if inside and len(mount_point) >= len(best):
+                    best, best_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return best_type
+
+def is_remote_file_system(fs_type):
+    # FUSE mounts are mostly network or sync clients (sshfs, rclone, Google Drive, ...)
+    return fs_type is not None and (fs_type in REMOTE_FILE_SYSTEMS or fs_type.startswith('fuse'))
+
+class InotifyBackend:
+    """Linux inotify through libc, one watch per (non-hidden) folder of the vault.
+
+    read_events() returns (changed paths, overflow). A folder that appears is watched right away and its
+    files are reported, since they may have been written before the watch existed. A folder that goes away
+    is reported as a path, which the catalog treats as "everything below it".
+    """
+
+    def __init__(self, root):
+        libc_name = ctypes.util.find_library('c') or 'libc.so.6'
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.root = root
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.paths = {} # watch descriptor -> folder
+        for directory in walk_directories(root):
+            self.add_watch(directory)
+
+    def add_watch(self, directory):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if error in (errno.ENOENT, errno.ENOTDIR):
+                return # gone again before we got to it
+            raise OSError(error, f"inotify_add_watch failed for '{directory}'")
+        self.paths[wd] = directory
+
+    def forget(self, directory):
+        # a folder was moved away: drop the watches of it and everything below it
+        prefix = directory + os.sep
+        for wd, path in list(self.paths.items()):
+            if path == directory or path.startswith(prefix):
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.paths[wd]
+
+    def read_events(self, timeout):
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set(), False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set(), False
+
+        changed = set()
+        overflow = False
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_length = EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_length].rstrip(b'\0')
+            offset += EVENT_HEADER.size + name_length
+            if mask & IN_Q_OVERFLOW:
+                overflow = True
+                continue
+            if mask & IN_IGNORED:
+                self.paths.pop(wd, None)
+                continue
+            directory = self.paths.get(wd)
+            if directory is None or not name:
+                continue # events about a watched folder itself are also reported by its parent
+            path = os.path.join(directory, os.fsdecode(name))
+            if name.startswith(b'.'):
+                continue
+            changed.add(path)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    for sub_dir in walk_directories(path):
+                        self.add_watch(sub_dir)
+                    changed.update(snapshot(path))
+                elif mask & IN_MOVED_FROM:
+                    self.forget(path)
+        return changed, overflow
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingBackend:
+    """Fallback for platforms (or file systems, e.g. network mounts) without inotify.
+
+    Every `interval` seconds only the folders are stat'ed: a folder whose mtime changed (a file was added,
+    removed or renamed in it) is listed again. Files edited in place do not change their folder's mtime, so the
+    mtimes and sizes of all files are compared every `full_interval` seconds.
+    """
+
+    def __init__(self, root, interval=DEFAULT_POLL_INTERVAL, full_interval=DEFAULT_FULL_SCAN_INTERVAL):
+        self.root = root
+        self.interval = interval
+        self.full_interval = full_interval
+        self.directories = {} # folder -> mtime_ns
+        self.files = {} # folder -> {path: (mtime_ns, size)} of the files directly in it
+        self.add_tree(root)
+        self.next_scan = time.monotonic() + interval
+        self.next_full_scan = time.monotonic() + full_interval
+
+    def add_tree(self, directory):
+        # start tracking directory and everything below it; returns the files found
+        found = set()
+        for folder in walk_directories(directory):
+            self.directories[folder] = directory_mtime(folder)
+            self.files[folder] = scan_directory(folder)[0]
+            found.update(self.files[folder])
+        return found
+
+    def forget_tree(self, directory):
+        # stop tracking directory and everything below it; returns the files it had
+        prefix = directory + os.sep
+        gone = set()
+        for folder in [folder for folder in self.directories if folder == directory or folder.startswith(prefix)]:
+            del self.directories[folder]
+            gone.update(self.files.pop(folder, {}))
+        return gone
+
+    def rescan_directory(self, directory, mtime):
+        self.directories[directory] = mtime
+        files, folders = scan_directory(directory)
+        old = self.files.get(directory, {})
+        changed = {path for path, state in files.items() if old.get(path) != state}
+        changed.update(path for path in old if path not in files)
+        self.files[directory] = files
+        for folder in folders:
+            if folder not in self.directories:
+                changed.update(self.add_tree(folder))
+        prefix = directory + os.sep
+        present = set(folders)
+        for folder in [folder for folder in self.directories if folder.startswith(prefix) and os.path.dirname(folder) == directory]:
+            if folder not in present:
+                changed.update(self.forget_tree(folder))
+        return changed
+
+    def read_events(self, timeout):
+        wait = self.next_scan - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            return set(), False
+        now = time.monotonic()
+        self.next_scan = now + self.interval
+        changed = set()
+        if now >= self.next_full_scan:
+            self.next_full_scan = now + self.full_interval
+            old = {path: state for files in self.files.values() for path, state in files.items()}
+            self.directories, self.files = {}, {}
+            self.add_tree(self.root)
+            files = {path: state for files in self.files.values() for path, state in files.items()}
+            changed = {path for path, state in files.items() if old.get(path) != state}
+            changed.update(path for path in old if path not in files)
+            return changed, False
+        for directory, mtime in list(self.directories.items()):
+            if directory not in self.directories:
+                continue # its parent was found gone earlier in this pass
+            current = directory_mtime(directory)
+            if current is None:
+                changed.update(self.forget_tree(directory))
+                changed.add(directory)
+            elif current != mtime:
+                changed.update(self.rescan_directory(directory, current))
+        return changed, False
+
+    def close(self):
+        pass
+
+class VaultWatcher:
+    """Watches the vault on a background thread and calls on_batch(paths, rescan) with coalesced changes.
+
+    Changes are collected until nothing has happened for `quiet_period` seconds (or for at most `max_delay`
+    seconds), so a burst such as a git pull turns into a single batch. rescan is True when the backend lost
+    track of events (inotify queue overflow) and the whole vault should be checked again.
+    on_batch runs on the watcher thread, one batch at a time.
+    """
+
+    def __init__(self, vault_path, on_batch, backend='auto', poll_interval=DEFAULT_POLL_INTERVAL,
+                 quiet_period=DEFAULT_QUIET_PERIOD, max_delay=DEFAULT_MAX_DELAY, full_scan_interval=DEFAULT_FULL_SCAN_INTERVAL):
+        self.vault_path = os.path.abspath(vault_path)
+        self.on_batch = on_batch
+        self.backend_name = backend
+        self.poll_interval = poll_interval
+        self.full_scan_interval = full_scan_interval
+        self.quiet_period = quiet_period
+        self.max_delay = max_delay
+        self.backend = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def open_backend(self):
+        if self.backend_name == 'auto' and sys.platform.startswith('linux'):
+            fs_type = mount_type(self.vault_path)
+            if is_remote_file_system(fs_type):
+                print(f"The vault is on a {fs_type} mount, where inotify misses remote changes; polling it every {self.poll_interval}s.")
+                return self.polling_backend()
+        if self.backend_name in ('auto', 'inotify') and sys.platform.startswith('linux'):
+            try:
+                return InotifyBackend(self.vault_path)
+            except (OSError, AttributeError) as e:
+                # AttributeError: libc without inotify; ENOSPC: out of fs.inotify.max_user_watches
+                warnings.warn(f"inotify unavailable ({e}); polling the vault every {self.poll_interval}s instead.")
+        elif self.backend_name == 'inotify':
+            warnings.warn(f"inotify is only available on Linux; polling the vault every {self.poll_interval}s instead.")
+        return self.polling_backend()
+
+    def polling_backend(self):
+        return PollingBackend(self.vault_path, self.poll_interval, self.full_scan_interval)
+
+    def start(self):
+        self.backend = self.open_backend()
+        self.thread = threading.Thread(target=self.run, name='vault-watcher', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        pending = set()
+        rescan = False
+        first_event = last_event = None
+        try:
+            while not self.stop_event.is_set():
+                timeout = 1.0 if first_event is None else max(0.0, min(last_event + self.quiet_period, first_event + self.max_delay) - time.monotonic())
+                changed, overflow = self.backend.read_events(timeout)
+                changed = {path for path in changed if not is_hidden(self.vault_path, path)}
+                now = time.monotonic()
+                if changed or overflow:
+                    pending |= changed
+                    rescan = rescan or overflow
+                    last_event = now
+                    first_event = first_event or now
+                if first_event is not None and (now - last_event >= self.quiet_period or now - first_event >= self.max_delay):
+                    batch, batch_rescan = pending, rescan
+                    pending, rescan, first_event, last_event = set(), False, None, None
+                    try:
+                        self.on_batch(batch, batch_rescan)
+                    except Exception as e:
+                        warnings.warn(f"Applying vault changes failed: {type(e).__name__}: {e}")
+        finally:
+            self.backend.close()
@@ -0,0 +1,98 @@
+import io
+import re
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+from storage import atomic_write_bytes, file_signature
+from frontmatter import read_header
+from instrument import traced, count
+
+date_line_pattern = re.compile(rb'Last Practice Date:[^\r\n]*')
+
+DEFAULT_WRITE_BACK_WORKERS = 8
+
+# single background thread so write-back batches run one after another, in export order
+background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='write-back')
+
+def write_back_date(file_path, signature, date_str):
+    """Set every "Last Practice Date:" line of one reading to date_str.
+
+    Returns (status, new_signature, body_offset) where status is 'updated', 'unchanged' (no date line, or already
+    set), 'modified' (the file changed since it was scanned, so it is left alone) or 'missing'. body_offset is
+    where the body starts now when a change of length may have moved it, None otherwise.
+    """
+    try:
+        if file_signature(file_path) != list(signature):
+            return 'modified', None, None
+        with open(file_path, 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        return 'missing', None, None
+
+    new_line = b'Last Practice Date: ' + date_str.encode('utf-8')
+    new_content = date_line_pattern.sub(new_line, content)
+    if new_content == content:
+        return 'unchanged', signature, None
+
+    body_offset = None
+    if len(new_content) == len(content):
+        # same length (the usual case: one date replaced by another), so only the changed span is rewritten
+        matches = list(date_line_pattern.finditer(content))
+        start, end = matches[0].start(), matches[-1].end()
+        with open(file_path, 'r+b') as file:
+            file.seek(start)
+            file.write(new_content[start:end])
+        count('note_bytes_written', end - start)
+    else:
+        # temp file + rename, so a crash never leaves a truncated note behind
+        atomic_write_bytes(file_path, new_content)
+        count('note_bytes_written', len(new_content))
+        # a date line in the front matter moves the body along with it
+        body_offset = read_header(io.BytesIO(new_content))[2]
+    count('notes_updated')
+    return 'updated', file_signature(file_path), body_offset
+
+@traced('write_back')
+def write_back_dates(entries, date_str, workers=DEFAULT_WRITE_BACK_WORKERS):
+    """Write date_str back into every (file_path, signature) of entries; returns {file_path: (status, new_signature, body_offset)}."""
+    def write(entry):
+        file_path, signature = entry
+        try:
+            return write_back_date(file_path, signature, date_str)
+        except OSError as e:
+            return f"failed: {e}", None, None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = list(executor.map(write, entries))
+    return {file_path: result for (file_path, _), result in zip(entries, results)}
+
+def report_write_back(results):
+    for file_path, (status, *_) in results.items():
+        if status == 'modified':
+            warnings.warn(f"'{file_path}' changed since it was scanned; its practice date was not updated.")
+        elif status not in ('updated', 'unchanged'):
+            warnings.warn(f"Could not update the practice date of '{file_path}': {status}")
+
+def start_write_back(entries, date_str, workers=DEFAULT_WRITE_BACK_WORKERS):
+    # returns a Future with the results of write_back_dates
+    return background_executor.submit(write_back_dates, list(entries), date_str, workers)
+
+def apply_write_back(df, results):
+    """Report skipped files and store the new mtime/size (and body offset) of the rewritten ones in their rows of df.
+
+    Rows are matched by path: df may be a newer frame than the one the export was picked from (a reload
+    rebuilds the frame with a new index).
+    """
+    report_write_back(results)
+    updated = {file_path: result for file_path, result in results.items() if result[0] == 'updated'}
+    if not updated:
+        return
+    paths = df['path'].astype(str)
+    rows = paths.isin(list(updated))
+    if not rows.any():
+        return # the notes were removed or renamed since the export was picked
+    df.loc[rows, ['mtime_ns', 'size']] = [updated[file_path][1] for file_path in paths[rows]]
+    moved = {file_path: body_offset for file_path, (_, _, body_offset) in updated.items() if body_offset is not None}
+    rows &= paths.isin(list(moved))
+    if rows.any():
+        df.loc[rows, 'body_offset'] = [moved[file_path] for file_path in paths[rows]]